@@ -0,0 +1,83 @@
+"""
+In-process caching primitives shared by the render path.
+
+Each uvicorn worker keeps its own instances; nothing here is shared across
+processes.
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class LRUCache:
+    """Bounded least-recently-used mapping.
+
+    The cache is bounded by entry count and, when a sizeof function is given,
+    by the total size of the stored values.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it as most recently used."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries when full."""
+        if self.max_entries <= 0:
+            return
+        size = self._size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.pop(key)
+            return
+
+        self.pop(key)
+        self._entries[key] = value
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= self._size(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._entries:
+            return default
+        value = self._entries.pop(key)
+        self.total_bytes -= self._size(value)
+        return value
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry whose key and value match the predicate."""
+        stale = [key for key, value in self._entries.items() if predicate(key, value)]
+        for key in stale:
+            self.pop(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _size(self, value: Any) -> int:
+        return self.sizeof(value) if self.sizeof is not None else 0
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,6 +20,76 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     workers: int = 1
 
+    # Maximum number of compiled templates kept per worker
+    template_cache_size: int = 512
+    # Directory for compiled template bytecode shared by all workers (disabled if unset)
+    template_bytecode_cache_dir: str | None = None
+    # Precompile every template when a worker starts
+    template_cache_warmup: bool = True
+
+    # Rendered public pages kept per worker
+    render_cache_max_entries: int = 10000
+    render_cache_max_bytes: int = 64 * 1024 * 1024
+    # Seconds a cached page is served without checking the database; template
+    # edits are pushed to every worker, so this only bounds missed notifications
+    render_cache_ttl: int = 3600
+    # Upper bound for the max-age sent to clients on rendered pages
+    render_cache_control_max_age: int = 300
+
+    # Failed public lookups (404/410) remembered per worker
+    negative_cache_max_entries: int = 100000
+    negative_cache_ttl: int = 300
+
+    # Largest accepted upload and the size of the chunks it is streamed in
+    upload_max_bytes: int = 500 * 1024 * 1024
+    upload_chunk_bytes: int = 1024 * 1024
+    # Processes used to parse and validate uploaded files
+    upload_process_workers: int = 2
+    # Rows read, validated and written to the result files at a time
+    upload_chunk_rows: int = 10000
+    # Rows written per multi-row INSERT when storing upload data; each chunk of
+    # upload_chunk_rows is committed at once, together with the job's checkpoint
+    upload_insert_batch_size: int = 1000
+    # How row payloads are stored: "shared" keeps variables that templates have
+    # in common once per row, "per_template" repeats them for every template,
+    # "packed" stores positional values against the job's payload_schema as
+    # compressed bytes (msgpack and zstd with the compact extra, which every
+    # web process and worker then needs)
+    upload_payload_storage: Literal["per_template", "shared", "packed"] = "shared"
+    # Default format of result and failed-row files: csv, parquet or arrow
+    # (the columnar formats need pyarrow)
+    upload_result_format: str = "csv"
+
+    # Run an upload worker inside each web process; disable when ingestion runs
+    # on dedicated `python -m app.worker` processes
+    upload_embedded_worker: bool = True
+    # Jobs processed at once by each worker process
+    upload_worker_concurrency: int = 2
+    # Seconds between queue polls when no job notification arrives
+    upload_worker_poll_interval: float = 5.0
+    # A job whose worker hasn't sent a heartbeat for this long is requeued
+    upload_job_lease_seconds: int = 60
+    # Jobs abandoned this many times are marked failed instead of requeued
+    upload_job_max_attempts: int = 3
+    # Minimum seconds between progress events published for a running job
+    upload_progress_interval: float = 1.0
+    # Seconds between keepalives on idle job event streams; the job is re-read
+    # from the database then, in case a notification was missed
+    upload_progress_keepalive: float = 15.0
+
+    # Days uploaded rows (and their jobs' result files) are kept
+    data_retention_days: int = 30
+    # Seconds between runs of the reaper deleting expired rows and old result
+    # files; 0 disables it in this process
+    data_reaper_interval: float = 3600.0
+    # Rows deleted per transaction by the reaper
+    data_reaper_batch_size: int = 5000
+
+    # How identifiers in public URLs are generated: blake2, sha256 (legacy hex) or random
+    identifier_strategy: str = "blake2"
+    identifier_min_length: int = 6
+    identifier_max_length: int = 32
+
     superuser_username: str = "admin"
     superuser_email: str = "admin@templr.com"
     superuser_password: str = "admin123"
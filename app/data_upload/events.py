@@ -0,0 +1,173 @@
+"""
+Upload job progress events.
+
+Workers publish a job's progress (rows processed, throughput and ETA) on
+UPLOAD_JOB_PROGRESS_CHANNEL after every stored batch, at most once per
+upload_progress_interval, and whenever the job's status changes. Every web
+process listens on the channel and hands each event to the server-sent event
+streams open for that job, so clients follow a job without polling the
+database.
+"""
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+import json
+import logging
+import time
+import uuid
+
+from app.config import settings
+from app.data_upload.models import UploadJob
+from app.database import async_session_maker
+from app.notifications import NotificationListener, notify
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_JOB_PROGRESS_CHANNEL = "templr_upload_job_progress"
+
+FINISHED_STATUSES = {"completed", "failed"}
+
+
+def job_progress_event(
+    job: UploadJob,
+    processed_rows: int | None = None,
+    rows_per_second: float | None = None,
+    eta_seconds: float | None = None,
+) -> dict:
+    """The progress event for a job, as sent to clients."""
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "processed_rows": (
+            processed_rows if processed_rows is not None else job.processed_rows
+        ),
+        "total_rows": job.total_rows,
+        "rows_per_second": rows_per_second,
+        "eta_seconds": eta_seconds,
+        # Notification payloads are limited to 8000 bytes
+        "error_message": (job.error_message or "")[:500] or None,
+    }
+
+
+class JobProgressReporter:
+    """Publishes a running job's progress, throttled to upload_progress_interval.
+
+    Throughput is measured over the current attempt, so a resumed job's ETA
+    isn't skewed by the rows it skipped.
+    """
+
+    def __init__(self, job: UploadJob, start_row: int = 0):
+        self.job = job
+        self.start_row = start_row
+        self.started_at = time.monotonic()
+        self._last_sent = 0.0
+
+    async def report(self, processed_rows: int, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_sent < settings.upload_progress_interval:
+            return
+        self._last_sent = now
+
+        rows_per_second = None
+        eta_seconds = None
+        elapsed = now - self.started_at
+        if elapsed > 0 and processed_rows > self.start_row:
+            rows_per_second = (processed_rows - self.start_row) / elapsed
+            if self.job.total_rows and self.job.status not in FINISHED_STATUSES:
+                remaining = max(self.job.total_rows - processed_rows, 0)
+                eta_seconds = round(remaining / rows_per_second, 1)
+            rows_per_second = round(rows_per_second, 1)
+
+        event = job_progress_event(
+            self.job, processed_rows, rows_per_second, eta_seconds
+        )
+        try:
+            # Sent on its own connection: the job's transaction only commits
+            # once per chunk
+            async with async_session_maker() as session:
+                await notify(session, UPLOAD_JOB_PROGRESS_CHANNEL, json.dumps(event))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to publish progress for job {self.job.id}: {e}")
+
+
+class JobProgressBroker:
+    """Fans progress events out to the streams following each job."""
+
+    def __init__(self, max_pending: int = 16):
+        self.max_pending = max_pending
+        self._queues: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, job_id: uuid.UUID) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        self._queues[str(job_id)].add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: uuid.UUID, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(str(job_id))
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._queues[str(job_id)]
+
+    def publish(self, event: dict) -> None:
+        for queue in self._queues.get(event["id"], ()):
+            if queue.full():
+                # A slow client only needs the latest progress
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def handle_notification(self, payload: str) -> None:
+        self.publish(json.loads(payload))
+
+
+job_progress_broker = JobProgressBroker()
+
+
+async def _load_job_event(job_id: uuid.UUID) -> dict | None:
+    async with async_session_maker() as session:
+        job = await session.scalar(select(UploadJob).where(UploadJob.id == job_id))
+        return job_progress_event(job) if job is not None else None
+
+
+async def job_event_stream(job_id: uuid.UUID, first_event: dict) -> AsyncIterator[str]:
+    """Server-sent events for a job, ending once it has finished.
+
+    When no event arrives for upload_progress_keepalive seconds the job is
+    re-read, which also covers notifications missed while the listener was
+    reconnecting; a comment line keeps idle connections open.
+    """
+    queue = job_progress_broker.subscribe(job_id)
+    try:
+        event = first_event
+        last_sent = None
+        while True:
+            if event is not None:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                last_sent = event
+                if event["status"] in FINISHED_STATUSES:
+                    return
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), settings.upload_progress_keepalive
+                )
+            except TimeoutError:
+                event = await _load_job_event(job_id)
+                if event is None:
+                    return
+                if (event["status"], event["processed_rows"]) == (
+                    last_sent["status"],
+                    last_sent["processed_rows"],
+                ):
+                    event = None
+                    yield ": keepalive\n\n"
+    finally:
+        job_progress_broker.unsubscribe(job_id, queue)
+
+
+def register_upload_events(listener: NotificationListener) -> None:
+    listener.subscribe(
+        UPLOAD_JOB_PROGRESS_CHANNEL, job_progress_broker.handle_notification
+    )
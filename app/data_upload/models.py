@@ -3,7 +3,7 @@ from typing import TYPE_CHECKING, Any
 import uuid
 
 from app.database import Base
-from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy import DateTime, ForeignKey, Index, LargeBinary, String
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -14,6 +14,15 @@ if TYPE_CHECKING:
 
 class UploadedData(Base):
     __tablename__ = "uploaded_data"
+    __table_args__ = (
+        # Serves containment (@>) filters such as has_template()
+        Index(
+            "ix_uploaded_data_template_slugs",
+            "template_slugs",
+            postgresql_using="gin",
+            postgresql_ops={"template_slugs": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -21,9 +30,10 @@ class UploadedData(Base):
     identifier: Mapped[str] = mapped_column(
         String(length=64), unique=True, index=True, nullable=False
     )
-    payload: Mapped[Any] = mapped_column(
-        JSONB, nullable=False
-    )  # Stores data row as JSON
+    # Stores data row as JSON; NULL for rows in the packed storage format,
+    # whose values are in payload_blob (see app.data_upload.payloads)
+    payload: Mapped[Any] = mapped_column(JSONB, nullable=True)
+    payload_blob: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
     template_slugs: Mapped[list] = mapped_column(
         JSONB, nullable=False
     )  # Associated template slugs
@@ -31,15 +41,29 @@ class UploadedData(Base):
         DateTime(timezone=True), server_default=func.now()
     )
     expires_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False
+        DateTime(timezone=True), index=True, nullable=False
     )
     owner_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("user.id"), nullable=False
     )
+    # Upload job that created the row, so a retried job can discard partial work.
+    # Packed payloads can only be decoded with the job's payload_schema, so a
+    # job can't be deleted while it has rows
+    job_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("upload_jobs.id", ondelete="RESTRICT"),
+        index=True,
+        nullable=True,
+    )
 
     # Relationships
     owner: Mapped["User"] = relationship("User", back_populates="data_rows")
 
+    @classmethod
+    def has_template(cls, slug: str):
+        """SQL condition for rows associated with a template, using the GIN index."""
+        return cls.template_slugs.contains([slug])
+
 
 class UploadJob(Base):
     __tablename__ = "upload_jobs"
@@ -48,8 +72,9 @@ class UploadJob(Base):
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     filename: Mapped[str] = mapped_column(String(length=255), nullable=False)
+    file_sha256: Mapped[str | None] = mapped_column(String(length=64), nullable=True)
     status: Mapped[str] = mapped_column(
-        String(length=20), nullable=False, default="pending"
+        String(length=20), nullable=False, default="pending", index=True
     )  # pending, processing, completed, failed
     total_rows: Mapped[int | None] = mapped_column(nullable=True)
     processed_rows: Mapped[int | None] = mapped_column(nullable=True, default=0)
@@ -60,6 +85,24 @@ class UploadJob(Base):
     failed_file_path: Mapped[str | None] = mapped_column(
         String(length=500), nullable=True
     )
+    # Format of the result and failed-row files: csv, parquet or arrow
+    result_format: Mapped[str] = mapped_column(
+        String(length=16), nullable=False, default="csv", server_default="csv"
+    )
+    # Queue bookkeeping: the stored upload, and which worker holds the job
+    source_file_path: Mapped[str | None] = mapped_column(
+        String(length=500), nullable=True
+    )
+    worker_id: Mapped[str | None] = mapped_column(String(length=255), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    # Progress committed with the last stored chunk: row offset, failure count
+    # and the state of the result files, so a retried job resumes from there
+    checkpoint: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    # Column layout of the rows' payloads when they are packed
+    payload_schema: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     template_slugs: Mapped[list] = mapped_column(JSONB, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
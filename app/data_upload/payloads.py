@@ -0,0 +1,260 @@
+"""
+Storage formats for the payload of uploaded rows.
+
+A row's logical payload holds one object per template, with the values
+mapped from the row for that template's variables. With the "per_template"
+format it is stored as is, so a row uploaded for several templates repeats
+every variable the templates have in common.
+
+The "shared" format stores those variables once. A variable that every
+template maps from the same column with the same type has the same value in
+every template's payload; it moves to a SHARED_KEY section and the
+per-template sections only keep what differs:
+
+    {"@shared": {"name": "John"}, "loan": {"amount": 1500}, "offer": {}}
+
+Slugs can't contain "@", so the section never clashes with a template.
+Pages are rendered from the merge of the shared and template sections,
+which the database computes (see template_payload()).
+
+The "packed" format drops the keys altogether. The job's payload_schema
+lists the distinct columns of the upload's payloads and, per template, the
+column of each variable; a row only stores its values, in column order, as
+a compact binary payload_blob (see encode_values()). Packed rows are
+decoded against their job's schema, so the job_id foreign key keeps a job
+from being deleted while it has rows. The schema also records each column's
+type, so pages are rendered from packed rows without looking up the
+template's variable types (see template_ready_payload()).
+
+Blobs are written with msgpack and zstd when the compact extra is installed.
+Every process that reads packed rows (web processes as well as workers)
+needs the same extra, or those rows fail to decode.
+"""
+
+from typing import Any
+import zlib
+
+from app.utils import create_variable_mapping, parse_stored_value
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import JSONB
+import ujson
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+SHARED_KEY = "@shared"
+
+PAYLOAD_STORAGE_FORMATS = ("per_template", "shared", "packed")
+
+
+def source_columns(template_variables: list, data_columns: list) -> dict[str, Any]:
+    """The data column each of a template's variables is mapped from."""
+    mapping = create_variable_mapping(template_variables, data_columns)
+    # Later columns win when several map to the same variable, as in map_data_row
+    return {var_name: col for col, var_name in mapping.items()}
+
+
+def shared_variables(data_columns: list, templates: list) -> set[str]:
+    """Variables with the same value in every template's payload.
+
+    That is the variables every template maps, from the same column and
+    with the same type. Depends only on the header, so it is the same for
+    every chunk of an upload.
+    """
+    if len(templates) < 2:
+        return set()
+    sources = []
+    for template in templates:
+        types = {var["name"]: var["type"] for var in template.variables}
+        sources.append(
+            {
+                var_name: (column, types[var_name])
+                for var_name, column in source_columns(
+                    template.variables, data_columns
+                ).items()
+            }
+        )
+    common = set(sources[0]).intersection(*sources[1:])
+    return {var for var in common if all(s[var] == sources[0][var] for s in sources)}
+
+
+def share_payload(
+    payload: dict[str, dict[str, Any]], shared: set[str]
+) -> dict[str, dict[str, Any]]:
+    """Convert a logical payload to the shared storage format."""
+    if not shared:
+        return payload
+    stored = {SHARED_KEY: {}}
+    for slug, values in payload.items():
+        stored[slug] = {}
+        for var_name, value in values.items():
+            if var_name in shared:
+                stored[SHARED_KEY][var_name] = value
+            else:
+                stored[slug][var_name] = value
+    return stored
+
+
+def expand_payload(stored: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Convert a stored payload, in either format, back to its logical form."""
+    shared = stored.get(SHARED_KEY)
+    if shared is None:
+        return stored
+    return {
+        slug: {**shared, **values}
+        for slug, values in stored.items()
+        if slug != SHARED_KEY
+    }
+
+
+def payload_schema(data_columns: list, templates: list) -> dict[str, Any]:
+    """Lay out the payloads of an upload as positional columns.
+
+    Variables mapped from the same column with the same type hold the same
+    value in every template's payload and share a column. Like
+    shared_variables(), this only depends on the header.
+    """
+    columns = []
+    column_indexes = {}
+    template_columns = {}
+    for template in templates:
+        sources = source_columns(template.variables, data_columns)
+        template_columns[template.slug] = {}
+        for var in template.variables:
+            if var["name"] not in sources:
+                continue
+            key = (var["name"], sources[var["name"]], var["type"])
+            if key not in column_indexes:
+                column_indexes[key] = len(columns)
+                columns.append({"name": var["name"], "type": var["type"]})
+            template_columns[template.slug][var["name"]] = column_indexes[key]
+    return {"columns": columns, "templates": template_columns}
+
+
+def pack_payload(
+    payload: dict[str, dict[str, Any]], schema: dict[str, Any]
+) -> list[Any]:
+    """A logical payload's values, in the schema's column order."""
+    values = [None] * len(schema["columns"])
+    for slug, template_columns in schema["templates"].items():
+        for var_name, index in template_columns.items():
+            values[index] = payload[slug][var_name]
+    return values
+
+
+def unpack_template_payload(
+    values: list[Any], template_columns: dict[str, int]
+) -> dict[str, Any]:
+    """One template's payload from a packed row's values."""
+    return {var_name: values[index] for var_name, index in template_columns.items()}
+
+
+def template_ready_payload(
+    values: list[Any],
+    columns: list[dict[str, str]],
+    template_columns: dict[str, int],
+) -> dict[str, Any]:
+    """One template's payload from a packed row's values, ready to render.
+
+    Values are converted with parse_stored_value() using the types in the
+    job's schema, rather than the template's variables.
+    """
+    return {
+        var_name: parse_stored_value(values[index], columns[index]["type"])
+        for var_name, index in template_columns.items()
+    }
+
+
+# A packed blob starts with two bytes naming its serializer and compression
+_SERIALIZERS = {b"j": "json", b"m": "msgpack"}
+_COMPRESSIONS = {b"n": "none", b"d": "zlib", b"z": "zstd"}
+
+_zstd_compressor = None
+_zstd_decompressor = None
+
+
+def encode_values(values: list[Any]) -> bytes:
+    """Serialize and compress a packed row's values.
+
+    Uses msgpack and zstd when they are installed, JSON and zlib otherwise.
+    Values that don't compress are stored uncompressed.
+    """
+    global _zstd_compressor
+    if msgpack is not None:
+        serializer, data = b"m", msgpack.packb(values)
+    else:
+        serializer = b"j"
+        data = ujson.dumps(
+            values, ensure_ascii=False, escape_forward_slashes=False
+        ).encode()
+
+    if zstandard is not None:
+        if _zstd_compressor is None:
+            _zstd_compressor = zstandard.ZstdCompressor()
+        compression, compressed = b"z", _zstd_compressor.compress(data)
+    else:
+        compression, compressed = b"d", zlib.compress(data)
+    if len(compressed) >= len(data):
+        compression, compressed = b"n", data
+    return serializer + compression + compressed
+
+
+def decode_values(blob: bytes) -> list[Any]:
+    """Inverse of encode_values(), whichever codecs the blob was written with.
+
+    Raises ValueError when the blob needs a codec that isn't installed, or
+    is corrupt.
+    """
+    global _zstd_decompressor
+    serializer = _SERIALIZERS.get(blob[:1])
+    compression = _COMPRESSIONS.get(blob[1:2])
+    if serializer is None or compression is None:
+        raise ValueError(f"Unknown packed payload encoding {blob[:2]!r}")
+    if serializer == "msgpack" and msgpack is None:
+        raise ValueError("Decoding msgpack payloads requires msgpack")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("Decoding zstd payloads requires zstandard")
+
+    data = blob[2:]
+    try:
+        if compression == "zlib":
+            data = zlib.decompress(data)
+        elif compression == "zstd":
+            if _zstd_decompressor is None:
+                _zstd_decompressor = zstandard.ZstdDecompressor()
+            data = _zstd_decompressor.decompress(data)
+        if serializer == "msgpack":
+            return msgpack.unpackb(data)
+        return ujson.loads(data)
+    except Exception as e:
+        raise ValueError(f"Corrupt packed payload: {e}") from e
+
+
+def load_payload(
+    payload: dict[str, Any] | None,
+    payload_blob: bytes | None,
+    schema: dict[str, Any] | None,
+) -> dict[str, dict[str, Any]]:
+    """A stored row's logical payload, whatever its storage format."""
+    if payload_blob is None:
+        return expand_payload(payload)
+    if schema is None:
+        raise ValueError("Packed payload has no payload_schema to decode it with")
+    values = decode_values(payload_blob)
+    return {
+        slug: unpack_template_payload(values, template_columns)
+        for slug, template_columns in schema["templates"].items()
+    }
+
+
+def template_payload(payload_column, slug: str):
+    """SQL expression for a template's logical payload; NULL without one."""
+    shared = func.coalesce(payload_column[SHARED_KEY], literal({}, JSONB))
+    return shared.op("||")(payload_column[slug])
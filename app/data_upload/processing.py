@@ -0,0 +1,400 @@
+"""
+CPU-bound stages of upload processing.
+
+Uploads are read in chunks (see app.data_upload.readers). Each chunk is read,
+and its mapping, validation and serialization run, in a separate process pool
+so large uploads never stall the event loop serving public pages, nor hold
+its GIL while parsing. Everything passed in or out of the pool is plain
+picklable data; database work stays on the event loop in DataUploadService.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+import multiprocessing
+from pathlib import Path
+from typing import Any
+import warnings
+
+from app.config import settings
+from app.data_upload.payloads import (
+    PAYLOAD_STORAGE_FORMATS,
+    encode_values,
+    pack_payload,
+    payload_schema,
+    share_payload,
+    shared_variables,
+    source_columns,
+)
+from app.data_upload.readers import open_upload_reader
+from app.identifiers import IdentifierStrategy
+from app.utils import make_json_serializable, validate_template_variables
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class TemplateSpec:
+    """The parts of a Template the processing pipeline needs."""
+
+    slug: str
+    name: str
+    variables: list[dict[str, Any]]
+
+
+@dataclass
+class ProcessedRow:
+    row_number: int
+    row_data: dict[str, Any]
+    payloads: dict[str, dict[str, Any]]
+    identifier_digest: str = ""
+    # UploadedData column values holding the payload, in its storage format
+    storage: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ProcessedChunk:
+    total_rows: int
+    rows: list[ProcessedRow] = field(default_factory=list)
+    failed_rows: list[dict[str, Any]] = field(default_factory=list)
+    # The upload's payload_schema, for the packed payload storage format
+    payload_schema: dict[str, Any] | None = None
+
+
+def _blank_mask(column: pd.Series) -> pd.Series:
+    """Rows with no value: NaN/None, or empty/whitespace-only strings."""
+    blank = column.isna()
+    if column.dtype == object:
+        blank |= column.astype(str).str.strip().eq("")
+    return blank
+
+
+def _invalid_messages(column: pd.Series, invalid: pd.Series, message: str) -> pd.Series:
+    """Per-row error messages for the invalid rows, None elsewhere."""
+    messages = (message + column.astype(str)).where(invalid)
+    return messages.astype(object).where(invalid, None)
+
+
+def _coerce_string(column: pd.Series, var_name: str) -> tuple[pd.Series, pd.Series]:
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.map(lambda value: value.isoformat(), na_action="ignore")
+    else:
+        values = column.astype(str)
+    values = values.astype(object).where(column.notna(), "")
+    return values, pd.Series(None, index=column.index, dtype=object)
+
+
+def _coerce_number(column: pd.Series, var_name: str) -> tuple[pd.Series, pd.Series]:
+    blank = _blank_mask(column)
+    if pd.api.types.is_numeric_dtype(column):
+        numbers = column
+        whole = pd.api.types.is_integer_dtype(column) or column.dtype == bool
+    else:
+        numbers = pd.to_numeric(column.where(~blank), errors="coerce")
+        # Strings without a decimal point become ints, like int("1500")
+        whole = ~column.astype(str).str.contains(".", regex=False) & (numbers % 1 == 0)
+
+    invalid = numbers.isna() & ~blank
+    values = numbers.astype(object)
+    if not isinstance(whole, bool):
+        as_int = whole & numbers.notna()
+        values[as_int] = numbers[as_int].astype("int64").astype(object)
+    values = values.where(~blank & ~invalid, -1)  # NaN imputation for numbers
+
+    errors = _invalid_messages(
+        column, invalid, f"Variable '{var_name}' should be number, got invalid value: "
+    )
+    return values, errors
+
+
+def _coerce_date(column: pd.Series, var_name: str) -> tuple[pd.Series, pd.Series]:
+    blank = _blank_mask(column)
+    errors = pd.Series(None, index=column.index, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        parsed = column
+    elif column.dtype == object:
+        kinds = column.map(type)
+        is_string = kinds.eq(str) & ~blank
+        is_datetime = column.map(lambda value: isinstance(value, datetime))
+
+        strings = column.where(is_string).str.replace("Z", "+00:00", regex=False)
+        try:
+            with warnings.catch_warnings():
+                # pandas 2.x only warns about mixed UTC offsets; newer versions raise
+                warnings.simplefilter("error", FutureWarning)
+                parsed_strings = pd.to_datetime(
+                    strings, format="ISO8601", errors="coerce"
+                )
+        except (ValueError, FutureWarning):
+            # Mixed UTC offsets can't share one dtype; parse each distinct value
+            lookup = {}
+            for value in strings.dropna().unique():
+                try:
+                    lookup[value] = datetime.fromisoformat(value)
+                except ValueError:
+                    lookup[value] = pd.NaT
+            parsed_strings = strings.map(lookup)
+
+        parsed = column.where(is_datetime, parsed_strings)
+        bad_format = is_string & parsed_strings.isna()
+        bad_type = ~blank & ~is_string & ~is_datetime
+        errors = _invalid_messages(
+            column,
+            bad_format,
+            f"Variable '{var_name}' should be date, got invalid format: ",
+        )
+        type_errors = f"Variable '{var_name}' should be date, got " + kinds.map(
+            lambda kind: kind.__name__
+        )
+        errors = errors.where(~bad_type, type_errors)
+    else:
+        # Numeric or boolean columns can't hold dates
+        parsed = pd.Series(pd.NaT, index=column.index)
+        bad_type = ~blank
+        type_name = {"b": "bool", "i": "int", "u": "int", "f": "float"}.get(
+            column.dtype.kind, column.dtype.name
+        )
+        errors = errors.where(
+            ~bad_type, f"Variable '{var_name}' should be date, got {type_name}"
+        )
+
+    valid = ~blank & errors.isna()
+    values = pd.Series(EPOCH_ISOFORMAT, index=column.index, dtype=object)
+    values[valid] = parsed[valid].map(lambda value: value.isoformat())
+    return values, errors
+
+
+def _coerce_other(column: pd.Series, var_name: str) -> tuple[pd.Series, pd.Series]:
+    values = column.map(make_json_serializable).astype(object)
+    return values, pd.Series(None, index=column.index, dtype=object)
+
+
+EPOCH_ISOFORMAT = datetime(1970, 1, 1).isoformat()
+
+_COERCERS = {
+    "string": _coerce_string,
+    "number": _coerce_number,
+    "date": _coerce_date,
+}
+
+
+def build_template_frame(
+    df: pd.DataFrame, template: TemplateSpec
+) -> tuple[pd.DataFrame, pd.Series]:
+    """Project the upload onto a template's variables with coerced types.
+
+    The column mapping is computed once for the whole frame. Returns the
+    JSON-ready values (one column per mapped variable) and a per-row series
+    holding the first validation error, or None for valid rows.
+    """
+    columns = source_columns(template.variables, df.columns.tolist())
+
+    values = {}
+    errors = pd.Series(None, index=df.index, dtype=object)
+    for var_def in template.variables:
+        var_name = var_def["name"]
+        if var_name not in columns:
+            continue
+        coerce = _COERCERS.get(var_def["type"], _coerce_other)
+        values[var_name], var_errors = coerce(df[columns[var_name]], var_name)
+        errors = errors.where(errors.notna(), var_errors)
+
+    frame = pd.DataFrame(values, index=df.index)
+    errors = errors.where(
+        errors.isna(), f"Template '{template.slug}': " + errors.fillna("")
+    )
+    return frame, errors
+
+
+def process_upload_chunk(
+    df: pd.DataFrame,
+    templates: list[TemplateSpec],
+    identifier_strategy: IdentifierStrategy,
+    first_row_number: int = 1,
+    payload_storage: str = "per_template",
+) -> ProcessedChunk:
+    """Build per-template payloads for every row of one chunk of an upload.
+
+    Mapping, type coercion, NaN imputation and validation run column-wise
+    over the whole chunk. Rows that fail validation are returned as
+    failed-row records with the original data preserved. Raises ValueError
+    when the headers don't match a template. Identifier digests for the
+    valid rows are computed here too, so the hashing stays off the event
+    loop. Row numbers count from first_row_number, the chunk's position in
+    the file. Payloads are also converted to the payload_storage format
+    (see app.data_upload.payloads); the packed format's payload_schema is
+    returned with the chunk.
+    """
+    if payload_storage not in PAYLOAD_STORAGE_FORMATS:
+        raise ValueError(f"Unknown payload storage format '{payload_storage}'")
+
+    # Validate headers against all templates
+    for template in templates:
+        is_valid, error_msg = validate_template_variables(
+            template.variables, df.columns.tolist()
+        )
+        if not is_valid:
+            raise ValueError(f"Template '{template.slug}': {error_msg}")
+
+    # Preserve original row order by using reset_index to get explicit row numbers
+    df = df.reset_index(drop=True)
+
+    # First error across templates, in template order, wins for each row
+    frames = {}
+    errors = pd.Series(None, index=df.index, dtype=object)
+    for template in templates:
+        frames[template.slug], template_errors = build_template_frame(df, template)
+        errors = errors.where(errors.notna(), template_errors)
+
+    failed = errors.notna().to_numpy()
+    processed = ProcessedChunk(total_rows=len(df))
+
+    valid_df = df[~failed]
+    records = valid_df.to_dict("records")
+    payload_records = {
+        slug: frame[~failed].to_dict("records") for slug, frame in frames.items()
+    }
+    payloads = [
+        {slug: rows[i] for slug, rows in payload_records.items()}
+        for i in range(len(records))
+    ]
+    digests = identifier_strategy.digests(payloads)
+    shared = set()
+    if payload_storage == "shared":
+        shared = shared_variables(df.columns.tolist(), templates)
+    elif payload_storage == "packed":
+        processed.payload_schema = payload_schema(df.columns.tolist(), templates)
+    for i, position in enumerate(np.flatnonzero(~failed)):
+        if processed.payload_schema is not None:
+            values = pack_payload(payloads[i], processed.payload_schema)
+            storage = {"payload": None, "payload_blob": encode_values(values)}
+        else:
+            storage = {"payload": share_payload(payloads[i], shared)}
+        processed.rows.append(
+            ProcessedRow(
+                row_number=first_row_number + int(position),
+                row_data=records[i],
+                payloads=payloads[i],
+                identifier_digest=digests[i],
+                storage=storage,
+            )
+        )
+
+    failed_records = df[failed].to_dict("records")
+    for record, position in zip(failed_records, np.flatnonzero(failed)):
+        # Detailed failed row record with original data preserved
+        record["_row_number"] = first_row_number + int(position)
+        record["_original_row_index"] = first_row_number + int(position) - 1
+        record["_error_reason"] = errors.iat[position]
+        record["_error_type"] = "ValueError"
+        processed.failed_rows.append(record)
+
+    return processed
+
+
+def count_upload_rows(file_path: Path, chunk_rows: int) -> int:
+    """Number of data rows in an upload; runs in the process pool."""
+    return open_upload_reader(file_path, chunk_rows).count_rows()
+
+
+def read_upload_chunk(
+    file_path: Path,
+    chunk_rows: int,
+    start_row: int,
+    templates: list[TemplateSpec],
+    identifier_strategy: IdentifierStrategy,
+    payload_storage: str = "per_template",
+) -> ProcessedChunk:
+    """Read the chunk of an upload starting at start_row and process it.
+
+    Runs in the process pool. The file is reopened for every chunk, and the
+    rows before start_row are skipped: Parquet and Arrow files seek to
+    them, CSV files split them without parsing them, and spreadsheets read
+    past them again. Past the end of the file the chunk is empty.
+    """
+    reader = open_upload_reader(file_path, chunk_rows)
+    chunk = next(reader.chunks(start_row))
+    return process_upload_chunk(
+        chunk, templates, identifier_strategy, start_row + 1, payload_storage
+    )
+
+
+class FailureLimit:
+    """Aborts an upload once more than half of its rows have failed validation.
+
+    Chunks are checked as they are processed, so the upload stops at the
+    same row it would have if the whole file had been validated up front.
+    """
+
+    def __init__(self, total_rows: int, ratio: float = 0.5):
+        self.max_failures = int(total_rows * ratio)
+        self.failures = 0
+        self.sample_errors: list[str] = []
+
+    def check(self, failed_rows: list[dict[str, Any]]) -> None:
+        """Count a chunk's failed rows, raising ValueError past the limit."""
+        for row in failed_rows:
+            self.failures += 1
+            # Get first few errors for summary
+            if len(self.sample_errors) < 3:
+                self.sample_errors.append(
+                    f"Row {row['_row_number']}: {row['_error_reason']}"
+                )
+            # If too many rows fail, abort the process
+            if self.failures > self.max_failures:
+                raise ValueError(
+                    f"Too many rows failed ({self.failures} out of {row['_row_number']}). "
+                    f"Sample errors: {self.sample_errors}"
+                )
+
+    def checkpoint(self) -> dict[str, Any]:
+        return {"failures": self.failures, "sample_errors": self.sample_errors}
+
+    def resume(self, state: dict[str, Any]) -> None:
+        """Carry on counting from a resumed job's checkpoint."""
+        self.failures = state["failures"]
+        self.sample_errors = list(state["sample_errors"])
+
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared upload process pool, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        # Spawn rather than fork: forking a process with a running event loop
+        # and open database connections is unsafe.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.upload_process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def run_in_process_pool(func, *args):
+    """Run a picklable function in the upload process pool.
+
+    A pool whose child died (e.g. killed for running out of memory) can't
+    run anything else, so it is dropped and the next call starts a new one.
+    """
+    global _process_pool
+    pool = get_process_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if _process_pool is pool:
+            _process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
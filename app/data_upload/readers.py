@@ -0,0 +1,371 @@
+"""
+Chunked readers for uploaded files.
+
+Readers yield an upload as DataFrames of at most chunk_rows rows, so a job
+holds one chunk in memory at a time however large the file is. Chunks keep
+the file's header and number their rows from the start of the file.
+chunks(start_row) skips the rows a resumed job has already processed.
+
+Excel workbooks are read with python-calamine when it is installed (much
+faster, and it also reads legacy .xls files), otherwise .xlsx files are
+streamed with openpyxl in read-only mode.
+
+Parquet and Arrow IPC (.arrow/.feather) files need pyarrow. Their columns
+are already typed, so there is no type inference, and they are read one
+record batch at a time.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Optional dependency
+    CalamineWorkbook = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency
+    pa = None
+    pq = None
+
+COLUMNAR_FILE_TYPES = {".parquet", ".arrow", ".feather"}
+
+
+def columnar_supported() -> bool:
+    """Whether pyarrow is installed, for Parquet and Arrow IPC files."""
+    return pa is not None
+
+
+class UploadReader(ABC):
+    def __init__(self, file_path: Path, chunk_rows: int):
+        self.file_path = file_path
+        self.chunk_rows = chunk_rows
+
+    @abstractmethod
+    def count_rows(self) -> int:
+        """Number of data rows in the file, excluding the header."""
+
+    @abstractmethod
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        """Yield the data rows from start_row on, chunk_rows at a time.
+
+        Always yields at least one (possibly empty) chunk.
+        """
+
+
+class CsvReader(UploadReader):
+    def count_rows(self) -> int:
+        # Parsing a single column is much cheaper than the full file, and
+        # unlike counting lines it handles quoted newlines correctly
+        return sum(
+            len(chunk)
+            for chunk in pd.read_csv(
+                self.file_path, usecols=[0], chunksize=self.chunk_rows
+            )
+        )
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        # Every cell is read as a string (blanks and "NA"-like values still
+        # become NaN) and typed by the template's variables when processed;
+        # dtypes inferred per chunk would turn the same column into ints in
+        # one chunk and floats in the next
+        options = {"dtype": str}
+        if start_row:
+            # Skip the header along with the processed rows (they are split
+            # but not parsed) and reuse the column names it defines
+            columns = pd.read_csv(self.file_path, nrows=0).columns
+            options.update(skiprows=start_row + 1, header=None, names=columns)
+        with pd.read_csv(
+            self.file_path, chunksize=self.chunk_rows, **options
+        ) as reader:
+            yield from reader
+
+
+class ExcelReader(UploadReader):
+    """Reads the whole workbook once, then hands it out in chunks.
+
+    Only used for legacy .xls files when python-calamine isn't installed.
+    """
+
+    def __init__(self, file_path: Path, chunk_rows: int):
+        super().__init__(file_path, chunk_rows)
+        self._frame: pd.DataFrame | None = None
+
+    def _load(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = pd.read_excel(self.file_path)
+        return self._frame
+
+    def count_rows(self) -> int:
+        return len(self._load())
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        frame = self._load().iloc[start_row:]
+        if frame.empty:
+            yield frame
+        for start in range(0, len(frame), self.chunk_rows):
+            yield frame.iloc[start : start + self.chunk_rows]
+
+
+class OpenpyxlReader(UploadReader):
+    """Streams the first sheet of an .xlsx file with openpyxl in read-only mode.
+
+    Only the rows of the current chunk are held in memory, instead of the
+    whole workbook.
+    """
+
+    def _rows(self) -> Iterator[tuple]:
+        workbook = openpyxl.load_workbook(
+            self.file_path, read_only=True, data_only=True
+        )
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def count_rows(self) -> int:
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            # The sheet's stored dimensions avoid a pass over the XML; they
+            # can include trailing blank rows, and are missing or bogus in
+            # files from some generators
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        if max_row is not None and max_row > 1:
+            return max_row - 1
+
+        rows = self._rows()
+        if next(rows, None) is None:
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        return sum(1 for _ in _trim_trailing_empty(rows))
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        return _frames_from_rows(self._rows(), self.chunk_rows, start_row)
+
+
+class CalamineReader(UploadReader):
+    """Reads the first sheet of an .xlsx or .xls file with python-calamine."""
+
+    def _sheet(self):
+        workbook = CalamineWorkbook.from_path(str(self.file_path))
+        return workbook.get_sheet_by_index(0)
+
+    def count_rows(self) -> int:
+        height = self._sheet().height
+        if height == 0:
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        return height - 1
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        return _frames_from_rows(
+            iter(self._sheet().iter_rows()), self.chunk_rows, start_row
+        )
+
+
+class ParquetReader(UploadReader):
+    """Reads a Parquet file one record batch at a time."""
+
+    def count_rows(self) -> int:
+        # Stored in the file footer, so no data is read
+        return pq.ParquetFile(self.file_path).metadata.num_rows
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        parquet_file = pq.ParquetFile(self.file_path)
+        # Row groups that end before start_row are never read
+        row_groups = []
+        skip = start_row
+        for index in range(parquet_file.num_row_groups):
+            group_rows = parquet_file.metadata.row_group(index).num_rows
+            if skip >= group_rows and not row_groups:
+                skip -= group_rows
+                continue
+            row_groups.append(index)
+
+        yielded = False
+        batches = parquet_file.iter_batches(
+            batch_size=self.chunk_rows, row_groups=row_groups
+        )
+        for batch in _skip_batch_rows(batches, skip):
+            yield _frame_from_arrow(batch)
+            yielded = True
+        if not yielded:
+            yield _frame_from_arrow(parquet_file.schema_arrow.empty_table())
+
+
+class ArrowReader(UploadReader):
+    """Reads an Arrow IPC file (.arrow, or .feather v2) through a memory map.
+
+    Record batches are sliced or combined into chunks of chunk_rows rows;
+    only the batches of the current chunk are paged in.
+    """
+
+    def _open(self):
+        return pa.ipc.open_file(pa.memory_map(str(self.file_path)))
+
+    def count_rows(self) -> int:
+        reader = self._open()
+        return sum(
+            reader.get_batch(index).num_rows
+            for index in range(reader.num_record_batches)
+        )
+
+    def chunks(self, start_row: int = 0) -> Iterator[pd.DataFrame]:
+        reader = self._open()
+        batches = (
+            reader.get_batch(index) for index in range(reader.num_record_batches)
+        )
+        pending = []
+        pending_rows = 0
+        yielded = False
+        for batch in _skip_batch_rows(batches, start_row):
+            while batch.num_rows:
+                take = min(batch.num_rows, self.chunk_rows - pending_rows)
+                pending.append(batch.slice(0, take))
+                pending_rows += take
+                batch = batch.slice(take)
+                if pending_rows == self.chunk_rows:
+                    yield _frame_from_arrow(pa.Table.from_batches(pending))
+                    pending = []
+                    pending_rows = 0
+                    yielded = True
+        if pending or not yielded:
+            yield _frame_from_arrow(pa.Table.from_batches(pending, reader.schema))
+
+
+def _skip_batch_rows(batches: Iterable, skip: int) -> Iterator:
+    """Drop the first `skip` rows from a stream of record batches."""
+    for batch in batches:
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        if skip:
+            batch = batch.slice(skip)
+            skip = 0
+        yield batch
+
+
+def _frame_from_arrow(data) -> pd.DataFrame:
+    """Convert a record batch or table to pandas.
+
+    Dates become datetime64 columns, like timestamps, so they are
+    validated the same way as parsed date strings.
+    """
+    return data.to_pandas(date_as_object=False)
+
+
+def _frames_from_rows(
+    rows: Iterator[Sequence[Any]], chunk_rows: int, start_row: int = 0
+) -> Iterator[pd.DataFrame]:
+    """Turn spreadsheet rows (header first) into DataFrame chunks."""
+    header = next(rows, None)
+    if header is None:
+        raise pd.errors.EmptyDataError("No columns to parse from file")
+    columns = _column_names(header)
+    width = len(columns)
+
+    chunk = []
+    yielded = False
+    for row in islice(_trim_trailing_empty(rows), start_row, None):
+        values = [_convert_cell(value) for value in row[:width]]
+        values.extend([None] * (width - len(values)))
+        chunk.append(values)
+        if len(chunk) == chunk_rows:
+            yield pd.DataFrame(chunk, columns=columns)
+            chunk = []
+            yielded = True
+    if chunk or not yielded:
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def _column_names(header: Sequence[Any]) -> list:
+    """Name columns like pd.read_excel does."""
+    header = list(header)
+    while header and _convert_cell(header[-1], header=True) is None:
+        header.pop()
+
+    columns = []
+    seen: dict[Any, int] = {}
+    for index, name in enumerate(header):
+        name = _convert_cell(name, header=True)
+        if name is None:
+            name = f"Unnamed: {index}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _convert_cell(value: Any, header: bool = False) -> Any:
+    """Convert a cell value the way pd.read_excel does.
+
+    Like pandas, strings such as "N/A" or "NULL" are missing values in data
+    cells but kept as column names in the header.
+    """
+    if value is None or value == "":
+        return None
+    if not header and isinstance(value, str) and value in STR_NA_VALUES:
+        return None
+    if isinstance(value, date):
+        # calamine returns dates for date-formatted cells; pandas has Timestamps
+        return pd.Timestamp(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in ERROR_CODES:
+        return None
+    return value
+
+
+def _is_empty_row(row: Sequence[Any]) -> bool:
+    return all(value is None or value == "" for value in row)
+
+
+def _trim_trailing_empty(rows: Iterable[Sequence[Any]]) -> Iterator[Sequence[Any]]:
+    """Yield rows, dropping blank rows at the end of the sheet.
+
+    Blank rows are held back until a non-blank row follows them, so
+    formatting that extends past the data doesn't add rows.
+    """
+    blank = []
+    for row in rows:
+        if _is_empty_row(row):
+            blank.append(row)
+            continue
+        yield from blank
+        blank = []
+        yield row
+
+
+def open_upload_reader(file_path: Path, chunk_rows: int) -> UploadReader:
+    suffix = file_path.suffix.lower()
+    if suffix in [".xlsx", ".xls"]:
+        if CalamineWorkbook is not None:
+            return CalamineReader(file_path, chunk_rows)
+        if suffix == ".xlsx":
+            return OpenpyxlReader(file_path, chunk_rows)
+        return ExcelReader(file_path, chunk_rows)
+    elif suffix == ".csv":
+        return CsvReader(file_path, chunk_rows)
+    elif suffix in COLUMNAR_FILE_TYPES:
+        if not columnar_supported():
+            raise ValueError(
+                f"Reading {suffix} files requires pyarrow (the columnar extra)"
+            )
+        if suffix == ".parquet":
+            return ParquetReader(file_path, chunk_rows)
+        return ArrowReader(file_path, chunk_rows)
+    raise ValueError(f"Unsupported file format: {file_path.suffix}")
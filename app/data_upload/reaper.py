@@ -0,0 +1,149 @@
+"""
+Retention for uploaded data.
+
+Rows are kept until expires_at (data_retention_days after their upload) and
+were only hidden at read time after that. The reaper deletes expired rows in
+batches of data_reaper_batch_size, each in its own short transaction, so the
+table and its unique identifier index stop growing and the deletes never hold
+locks for long. Batches skip rows locked by another reaper, so every web and
+worker process can run one.
+
+It also deletes the files of jobs that finished (or failed) more than
+data_retention_days ago, whose links have expired with their rows: the
+result and failed-row files, the uploaded source file if it's still there,
+and whatever an interrupted attempt left behind (partial result files and
+their .parts spill directories).
+
+uploaded_data isn't partitioned by expires_at: unique indexes on a
+partitioned table must include the partition key, so identifiers could no
+longer be kept unique across the whole table.
+"""
+
+import asyncio
+from datetime import timedelta
+import logging
+from pathlib import Path
+import shutil
+
+from app.config import settings
+from app.data_upload.models import UploadedData, UploadJob
+from app.database import async_session_maker
+from sqlalchemy import delete, func, or_, select
+
+logger = logging.getLogger(__name__)
+
+
+class DataReaper:
+    """Periodically deletes expired rows and old result files."""
+
+    def __init__(self, interval: float | None = None, batch_size: int | None = None):
+        self.interval = interval or settings.data_reaper_interval
+        self.batch_size = batch_size or settings.data_reaper_batch_size
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Data reaper run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> tuple[int, int]:
+        """Returns the number of rows and job files deleted."""
+        rows = await self.delete_expired_rows()
+        files = await self.delete_old_job_files()
+        if rows or files:
+            logger.info(f"Reaped {rows} expired rows and {files} old job files")
+        return rows, files
+
+    async def delete_expired_rows(self) -> int:
+        expired = (
+            select(UploadedData.id)
+            .where(UploadedData.expires_at < func.now())
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        deleted = 0
+        while True:
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    delete(UploadedData)
+                    .where(UploadedData.id.in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                return deleted
+
+    async def delete_old_job_files(self) -> int:
+        cutoff = func.now() - timedelta(days=settings.data_retention_days)
+        old_jobs = (
+            select(UploadJob)
+            .where(
+                UploadJob.status.in_(["completed", "failed"]),
+                UploadJob.completed_at < cutoff,
+                or_(
+                    UploadJob.result_file_path.is_not(None),
+                    UploadJob.failed_file_path.is_not(None),
+                    UploadJob.source_file_path.is_not(None),
+                ),
+            )
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        deleted = 0
+        while True:
+            async with async_session_maker() as session:
+                jobs = (await session.execute(old_jobs)).scalars().all()
+                for job in jobs:
+                    deleted += await asyncio.to_thread(delete_job_files, job)
+                    job.result_file_path = None
+                    job.failed_file_path = None
+                    job.source_file_path = None
+                await session.commit()
+            if len(jobs) < self.batch_size:
+                return deleted
+
+
+def delete_job_files(job: UploadJob, upload_dir: Path = Path("uploads")) -> int:
+    """Delete a finished job's files, including leftovers of interrupted attempts."""
+    paths = {
+        Path(file_path)
+        for file_path in (
+            job.result_file_path,
+            job.failed_file_path,
+            job.source_file_path,
+        )
+        if file_path
+    }
+    for prefix in ("result", "failed"):
+        paths.update(upload_dir.glob(f"{prefix}_{job.id}.*"))
+
+    deleted = 0
+    for path in paths:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink(missing_ok=True)
+        else:
+            continue
+        deleted += 1
+    return deleted
@@ -3,21 +3,38 @@ from pathlib import Path
 import uuid
 
 from app.auth.config import current_active_user
+from app.data_upload.events import job_event_stream, job_progress_event
 from app.data_upload.schemas import UploadedDataRead, UploadJobRead
 from app.data_upload.service import DataUploadService
 from app.database import get_async_session
 from app.users.models import User
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/data-upload", tags=["data-upload"])
 
+# Result file extension -> media type
+RESULT_MEDIA_TYPES = {
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def _find_job_file(prefix: str, job_id: uuid.UUID) -> Path | None:
+    """Find a job's result or failed-row file, whatever its format."""
+    for path in Path("uploads").glob(f"{prefix}_{job_id}.*"):
+        if path.suffix in RESULT_MEDIA_TYPES and path.is_file():
+            return path
+    return None
+
 
 @router.post("/", response_model=UploadJobRead)
 async def upload_data(
     file: UploadFile = File(...),
     template_slugs: str = Form(...),  # JSON string of template slugs
+    result_format: str | None = Form(None),  # csv, parquet or arrow
     current_user: User = Depends(current_active_user),
     session: AsyncSession = Depends(get_async_session),
 ):
@@ -32,7 +49,9 @@ async def upload_data(
         )
 
     service = DataUploadService(session)
-    job = await service.create_upload_job(file, template_slugs_list, current_user)
+    job = await service.create_upload_job(
+        file, template_slugs_list, current_user, result_format
+    )
     return job
 
 
@@ -59,6 +78,26 @@ async def get_upload_job(
     return job
 
 
+@router.get("/jobs/{job_id}/events")
+async def stream_upload_job_events(
+    job_id: uuid.UUID,
+    current_user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Server-sent progress events (progress, throughput, ETA) for a job."""
+    service = DataUploadService(session)
+    job = await service.get_upload_job(job_id, current_user)
+    first_event = job_progress_event(job)
+    # Streams stay open for the whole job; don't hold a connection for them
+    await session.close()
+
+    return StreamingResponse(
+        job_event_stream(job_id, first_event),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/jobs/{job_id}/download")
 async def download_result_file(
     job_id: uuid.UUID,
@@ -78,14 +117,17 @@ async def download_result_file(
     if job.status != "completed" or not job.result_file_path:
         raise HTTPException(status_code=400, detail="Result file not available")
 
-    # Generate CSV filename from original filename (remove extension and add .csv)
+    # Name the download after the original file, with the result's extension
     import os
 
     original_name = os.path.splitext(job.filename)[0]
-    csv_filename = f"processed_{original_name}.csv"
+    suffix = Path(job.result_file_path).suffix
+    download_filename = f"processed_{original_name}{suffix}"
 
     return FileResponse(
-        path=job.result_file_path, filename=csv_filename, media_type="text/csv"
+        path=job.result_file_path,
+        filename=download_filename,
+        media_type=RESULT_MEDIA_TYPES.get(suffix, "application/octet-stream"),
     )
 
 
@@ -94,17 +136,15 @@ async def download_result_file_public(
     job_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)
 ):
     """Public download endpoint for result files - no authentication required"""
-    # Construct the expected result file path
-    upload_dir = Path("uploads")
-    result_file_path = upload_dir / f"result_{job_id}.csv"
+    result_file_path = _find_job_file("result", job_id)
 
-    if not result_file_path.exists():
+    if result_file_path is None:
         raise HTTPException(status_code=404, detail="Result file not found")
 
     return FileResponse(
         path=str(result_file_path),
-        filename=f"processed_results_{job_id}.csv",
-        media_type="text/csv",
+        filename=f"processed_results_{job_id}{result_file_path.suffix}",
+        media_type=RESULT_MEDIA_TYPES[result_file_path.suffix],
     )
 
 
@@ -126,14 +166,17 @@ async def download_failed_rows_file(
     if not job.failed_file_path:
         raise HTTPException(status_code=404, detail="Failed rows file not available")
 
-    # Generate CSV filename for failed rows
+    # Generate filename for failed rows, with the file's extension
     import os
 
     original_name = os.path.splitext(job.filename)[0]
-    csv_filename = f"failed_rows_{original_name}.csv"
+    suffix = Path(job.failed_file_path).suffix
+    download_filename = f"failed_rows_{original_name}{suffix}"
 
     return FileResponse(
-        path=job.failed_file_path, filename=csv_filename, media_type="text/csv"
+        path=job.failed_file_path,
+        filename=download_filename,
+        media_type=RESULT_MEDIA_TYPES.get(suffix, "application/octet-stream"),
     )
 
 
@@ -142,20 +185,30 @@ async def download_failed_rows_public(
     job_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)
 ):
     """Public download endpoint for failed rows files - no authentication required"""
-    # Construct the expected failed file path
-    upload_dir = Path("uploads")
-    failed_file_path = upload_dir / f"failed_{job_id}.csv"
+    failed_file_path = _find_job_file("failed", job_id)
 
-    if not failed_file_path.exists():
+    if failed_file_path is None:
         raise HTTPException(status_code=404, detail="Failed rows file not found")
 
     return FileResponse(
         path=str(failed_file_path),
-        filename=f"failed_rows_{job_id}.csv",
-        media_type="text/csv",
+        filename=f"failed_rows_{job_id}{failed_file_path.suffix}",
+        media_type=RESULT_MEDIA_TYPES[failed_file_path.suffix],
     )
 
 
+@router.get("/templates/{slug:path}/data", response_model=list[UploadedDataRead])
+async def get_template_data(
+    slug: str,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    service = DataUploadService(session)
+    return await service.get_uploaded_data_for_template(slug, current_user, skip, limit)
+
+
 @router.get("/data/{identifier}", response_model=UploadedDataRead)
 async def get_uploaded_data(
     identifier: str, session: AsyncSession = Depends(get_async_session)
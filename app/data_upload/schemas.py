@@ -1,7 +1,8 @@
 from datetime import datetime
 import uuid
 
-from pydantic import BaseModel
+from app.data_upload.payloads import expand_payload
+from pydantic import BaseModel, field_validator
 
 
 class UploadDataRequest(BaseModel):
@@ -11,12 +12,14 @@ class UploadDataRequest(BaseModel):
 class UploadJobRead(BaseModel):
     id: uuid.UUID
     filename: str
+    file_sha256: str | None = None
     status: str
     total_rows: int | None = None
     processed_rows: int | None = None
     error_message: str | None = None
     result_file_path: str | None = None
     failed_file_path: str | None = None
+    result_format: str = "csv"
     template_slugs: list[str]
     created_at: datetime
     completed_at: datetime | None = None
@@ -33,5 +36,11 @@ class UploadedDataRead(BaseModel):
     created_at: datetime
     expires_at: datetime
 
+    @field_validator("payload")
+    @classmethod
+    def expand_stored_payload(cls, v: dict) -> dict:
+        # Always one object per template, whatever the storage format
+        return expand_payload(v)
+
     class Config:
         from_attributes = True
@@ -1,33 +1,52 @@
 import asyncio
+from collections.abc import Awaitable, Callable, Iterator
 from datetime import datetime
+import hashlib
 import logging
 from pathlib import Path
 import traceback
 import uuid
 
 from app.config import settings
+from app.data_upload.events import JobProgressReporter
 from app.data_upload.models import UploadedData, UploadJob
+from app.data_upload.payloads import load_payload
+from app.data_upload.processing import (
+    FailureLimit,
+    ProcessedChunk,
+    TemplateSpec,
+    count_upload_rows,
+    read_upload_chunk,
+    run_in_process_pool,
+)
+from app.data_upload.readers import COLUMNAR_FILE_TYPES, columnar_supported
+from app.data_upload.writers import RESULT_FORMATS, open_row_writer
 from app.database import async_session_maker
+from app.identifiers import identifier_strategy
+from app.notifications import notify
 from app.templates.models import Template
 from app.templates.service import TemplateService
 from app.users.models import User
-from app.utils import (
-    calculate_expiry_date,
-    generate_unique_identifier_from_set,
-    get_existing_identifiers,
-    make_json_serializable_with_context,
-    map_data_row,
-    validate_data_types,
-    validate_template_variables,
-)
+from app.utils import calculate_expiry_date
 from fastapi import HTTPException, UploadFile, status
 import pandas as pd
-from sqlalchemy import and_, select
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+SUPPORTED_FILE_TYPES = {".csv", ".xlsx", ".xls"} | COLUMNAR_FILE_TYPES
+
+# Notified when a job is queued, so idle upload workers claim it immediately
+UPLOAD_JOB_QUEUED_CHANNEL = "templr_upload_job_queued"
+
+
+class JobLeaseLost(Exception):
+    """The job was requeued or claimed by another worker while processing."""
+
 
 class DataUploadService:
     def __init__(self, session: AsyncSession):
@@ -36,8 +55,38 @@ class DataUploadService:
         self.upload_dir.mkdir(exist_ok=True)
 
     async def create_upload_job(
-        self, file: UploadFile, template_slugs: list[str], owner: User
+        self,
+        file: UploadFile,
+        template_slugs: list[str],
+        owner: User,
+        result_format: str | None = None,
     ) -> UploadJob:
+        # Reject unsupported or oversized files before doing any work
+        suffix = Path(file.filename or "").suffix.lower()
+        if suffix not in SUPPORTED_FILE_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported file format: {suffix or file.filename}",
+            )
+        result_format = result_format or settings.upload_result_format
+        if result_format not in RESULT_FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported result format: {result_format}",
+            )
+        if not columnar_supported() and (
+            suffix in COLUMNAR_FILE_TYPES or result_format != "csv"
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parquet and Arrow files are not supported on this server",
+            )
+        if file.size is not None and file.size > settings.upload_max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds the {settings.upload_max_bytes} byte limit",
+            )
+
         # Validate template slugs exist and belong to user
         template_service = TemplateService(self.session)
         templates = []
@@ -58,34 +107,66 @@ class DataUploadService:
 
         # Save uploaded file
         file_path = self.upload_dir / f"{uuid.uuid4()}_{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        file_sha256 = await self._save_upload(file, file_path)
 
-        # Create upload job
+        # Queue the upload job; a worker claims it once this commits
         job = UploadJob(
             filename=file.filename,
+            file_sha256=file_sha256,
+            source_file_path=str(file_path),
+            result_format=result_format,
             status="pending",
             template_slugs=template_slugs,
             owner_id=owner.id,
         )
         self.session.add(job)
+        await self.session.flush()
+        await notify(self.session, UPLOAD_JOB_QUEUED_CHANNEL, str(job.id))
         await self.session.commit()
         await self.session.refresh(job)
 
-        # Start background processing
-        asyncio.create_task(
-            self._process_upload_background(job.id, file_path, templates)
-        )
-
         return job
 
-    async def _process_upload_background(
-        self, job_id: uuid.UUID, file_path: Path, templates: list[Template]
-    ):
-        """Background task to process uploaded data with comprehensive error handling."""
+    async def _save_upload(self, file: UploadFile, file_path: Path) -> str:
+        """Stream an upload to disk in chunks and return its SHA-256 checksum.
+
+        Memory use stays at one chunk regardless of file size, and writes run
+        in a thread so the event loop keeps serving requests.
+        """
+        checksum = hashlib.sha256()
+        size = 0
+        buffer = await asyncio.to_thread(open, file_path, "wb")
+        try:
+            while chunk := await file.read(settings.upload_chunk_bytes):
+                size += len(chunk)
+                if size > settings.upload_max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {settings.upload_max_bytes} byte limit",
+                    )
+                checksum.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(buffer.close)
+            file_path.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(buffer.close)
+
+        logger.info(f"Saved upload {file_path} ({size} bytes)")
+        return checksum.hexdigest()
+
+    async def process_upload_job(self, job_id: uuid.UUID):
+        """Process a claimed upload job with comprehensive error handling.
+
+        Called by an upload worker after it has claimed the job. Every chunk
+        is committed together with a checkpoint, so a job that is retried
+        after its worker stopped resumes after the last committed chunk. If
+        the earlier attempt's result files are gone, its rows are discarded
+        and the job starts over.
+        """
         session = None
         job = None
+        file_path = None
 
         try:
             session = async_session_maker()
@@ -101,180 +182,178 @@ class DataUploadService:
                 logger.error(f"Job {job_id} not found in database")
                 return
 
-            # Update status to processing
-            job.status = "processing"
-            await session.commit()
-            logger.info(f"Job {job_id} status updated to processing")
+            file_path = Path(job.source_file_path)
+            logger.info(f"Job {job_id} claimed, attempt {job.attempts}")
 
             try:
-                # Read file with proper error handling
-                logger.info(f"Reading file: {file_path}")
-                if file_path.suffix.lower() in [".xlsx", ".xls"]:
-                    df = pd.read_excel(file_path)
-                elif file_path.suffix.lower() == ".csv":
-                    df = pd.read_csv(file_path)
-                else:
-                    raise ValueError(f"Unsupported file format: {file_path.suffix}")
-
-                logger.info(
-                    f"File read successfully. Rows: {len(df)}, Columns: {list(df.columns)}"
-                )  # Validate headers against all templates
-                for template in templates:
-                    logger.debug(
-                        f"Validating template {template.slug} against data columns"
+                templates = await self._load_job_templates(session, job)
+                claimed_by = job.worker_id
+                template_specs = [
+                    TemplateSpec(
+                        slug=template.slug,
+                        name=template.name,
+                        variables=template.variables,
                     )
-                    is_valid, error_msg = validate_template_variables(
-                        template.variables, df.columns.tolist()
-                    )
-                    if not is_valid:
-                        raise ValueError(f"Template '{template.slug}': {error_msg}")
+                    for template in templates
+                ]
+                logger.info(f"Processing file: {file_path}")
+                chunk_rows = settings.upload_chunk_rows
+                job.total_rows = await run_in_process_pool(
+                    count_upload_rows, file_path, chunk_rows
+                )
+                await session.commit()
+                logger.info(f"File has {job.total_rows} rows")
 
-                job.total_rows = len(df)
+                result_writer = open_row_writer(
+                    self.upload_dir / f"result_{job_id}", job.result_format
+                )
+                failed_writer = open_row_writer(
+                    self.upload_dir / f"failed_{job_id}", job.result_format
+                )
+                failure_limit = FailureLimit(job.total_rows)
+                expires_at = calculate_expiry_date()
+                sample_errors = []
+                row_offset = 0
+                if job.checkpoint:
+                    try:
+                        await asyncio.to_thread(
+                            result_writer.resume, job.checkpoint["result_file"]
+                        )
+                        await asyncio.to_thread(
+                            failed_writer.resume, job.checkpoint["failed_file"]
+                        )
+                        failure_limit.resume(job.checkpoint["failure_limit"])
+                        sample_errors = list(job.checkpoint["sample_errors"])
+                        expires_at = datetime.fromisoformat(
+                            job.checkpoint["expires_at"]
+                        )
+                        row_offset = job.checkpoint["row_offset"]
+                        logger.info(f"Resuming job {job_id} from row {row_offset}")
+                    except ValueError as e:
+                        logger.warning(f"Can't resume job {job_id}, restarting: {e}")
+                        result_writer.discard()
+                        failed_writer.discard()
+                        job.checkpoint = None
+                if not job.checkpoint:
+                    # Rows from an attempt that can't be resumed are redone
+                    job.payload_schema = None
+                    discarded = await session.execute(
+                        delete(UploadedData).where(UploadedData.job_id == job.id)
+                    )
+                    if discarded.rowcount:
+                        logger.info(
+                            f"Discarded {discarded.rowcount} rows from an earlier attempt of job {job_id}"
+                        )
+                job.processed_rows = row_offset
                 await session.commit()
-                logger.info(f"Template validation passed. Processing {len(df)} rows")
-                # Fetch all existing identifiers upfront for fast lookup optimization
-                existing_identifiers = await get_existing_identifiers(session)
-                logger.info(
-                    f"Loaded {len(existing_identifiers)} existing identifiers for fast lookup"
+                # A resumed job keeps the storage format its rows were packed in
+                payload_storage = (
+                    "packed" if job.payload_schema else settings.upload_payload_storage
                 )
+                progress = JobProgressReporter(job, row_offset)
+                await progress.report(row_offset, force=True)
 
-                # Process each row with error tracking
-                processed_data = []
-                data_columns = df.columns.tolist()
-                failed_rows = []
-
-                # Preserve original row order by using reset_index to get explicit row numbers
-                df_with_index = df.reset_index(drop=True)
-
-                for index, (original_index, row) in enumerate(df_with_index.iterrows()):
-                    row_data = {}  # Initialize to avoid unbound variable issues
-                    try:
-                        row_data = row.to_dict()
-                        # Map data columns to template variables for each template
-                        for template in templates:
-                            # Map the row data to template variable names
-                            mapped_data = map_data_row(
-                                row_data, template.variables, data_columns
-                            )
-
-                            # Validate data types against template variables
-                            is_valid, error_msg = validate_data_types(
-                                mapped_data, template.variables
-                            )
-                            if not is_valid:
+                try:
+                    # Read and map/validate/serialize in the process pool, so
+                    # only one chunk is held in memory at a time and parsing
+                    # never competes with the event loop serving requests
+                    while True:
+                        processed = await run_in_process_pool(
+                            read_upload_chunk,
+                            file_path,
+                            chunk_rows,
+                            row_offset,
+                            template_specs,
+                            identifier_strategy,
+                            payload_storage,
+                        )
+                        failure_limit.check(processed.failed_rows)
+                        if processed.payload_schema is not None:
+                            if job.payload_schema is None:
+                                job.payload_schema = processed.payload_schema
+                            elif job.payload_schema != processed.payload_schema:
                                 raise ValueError(
-                                    f"Template '{template.slug}': {error_msg}"
+                                    "The job's templates changed since it was started"
                                 )
 
-                        # Create template-specific payloads for each template since they may have different variable mappings
-                        template_payloads = {}
-                        for template in templates:
-                            # Map data for this specific template
-                            template_mapped_data = map_data_row(
-                                row_data, template.variables, data_columns
-                            )
-
-                            # Make data JSON serializable with this template's variable context
-                            template_serializable_data = (
-                                make_json_serializable_with_context(
-                                    template_mapped_data, template.variables
-                                )
-                            )
-                            template_payloads[template.slug] = (
-                                template_serializable_data
-                            )
-
-                        # Ensure main_payload is a dict (it should be since template_mapped_data is a dict)
-                        if not isinstance(template_payloads, dict):
-                            raise ValueError(
-                                f"Expected dict after serialization, got {type(template_payloads)}"
-                            )
-
-                        # Generate unique identifier using mapped data
-                        identifier = generate_unique_identifier_from_set(
-                            template_payloads, existing_identifiers
+                        # A chunk's rows, file output and checkpoint are
+                        # committed together, under a lock on the job that
+                        # also fences off a worker which lost its lease
+                        await self._lock_claimed_job(session, job, claimed_by)
+                        result_rows, storage_failed_rows = await self._store_chunk(
+                            session,
+                            job,
+                            templates,
+                            processed,
+                            expires_at,
+                            progress.report,
                         )
-
-                        # Create uploaded data record with mapped data
-                        uploaded_data = UploadedData(
-                            identifier=identifier,
-                            payload=template_payloads,  # Store the full payload with template-specific data
-                            template_slugs=job.template_slugs,
-                            expires_at=calculate_expiry_date(),
-                            owner_id=job.owner_id,
+                        failed_rows = sorted(
+                            processed.failed_rows + storage_failed_rows,
+                            key=lambda failed_row: failed_row["_row_number"],
                         )
-                        session.add(uploaded_data)
-
-                        # Add to processed data for result file with original row order preserved
-                        processed_row = row_data.copy()
-                        # Add template URLs with domain
-                        for template in templates:
-                            processed_row[f"{template.name}_url"] = (
-                                f"{settings.domain}/{template.slug}/{identifier}"
-                            )
-
-                        processed_data.append(processed_row)
-
-                        job.processed_rows = (
-                            index + 1
-                        )  # Commit every 100 rows to avoid large transactions
-                        if (index + 1) % 1000 == 0:
-                            await session.commit()
-                            logger.debug(f"Committed batch at row {index + 1}")
-
-                    except Exception as row_error:
-                        logger.warning(
-                            f"Failed to process row {index + 1}: {str(row_error)}"
+                        await asyncio.to_thread(result_writer.write, result_rows)
+                        await asyncio.to_thread(failed_writer.write, failed_rows)
+                        sample_errors.extend(
+                            f"Row {row['_row_number']}: {row['_error_reason'][:100]}"
+                            for row in failed_rows[: 3 - len(sample_errors)]
                         )
 
-                        # Create detailed failed row record with original data preserved
-                        failed_row_record = (
-                            row_data.copy()
-                        )  # Preserve all original column data
-                        failed_row_record["_row_number"] = index + 1
-                        failed_row_record["_original_row_index"] = original_index
-                        failed_row_record["_error_reason"] = str(row_error)
-                        failed_row_record["_error_type"] = type(row_error).__name__
-
-                        failed_rows.append(
-                            failed_row_record
-                        )  # If too many rows fail, abort the process
-                        if len(failed_rows) > len(df) * 0.5:  # More than 50% failed
-                            # Get first few errors for summary
-                            sample_errors = [
-                                f"Row {row['_row_number']}: {row['_error_reason']}"
-                                for row in failed_rows[:3]
-                            ]
-                            raise ValueError(
-                                f"Too many rows failed ({len(failed_rows)} out of {index + 1}). Sample errors: {sample_errors}"
-                            )
-
-                # Final commit for any remaining rows
-                await session.commit()
+                        row_offset += processed.total_rows
+                        job.processed_rows = row_offset
+                        job.checkpoint = {
+                            "row_offset": row_offset,
+                            "expires_at": expires_at.isoformat(),
+                            "sample_errors": sample_errors,
+                            "failure_limit": failure_limit.checkpoint(),
+                            "result_file": await asyncio.to_thread(
+                                result_writer.checkpoint
+                            ),
+                            "failed_file": await asyncio.to_thread(
+                                failed_writer.checkpoint
+                            ),
+                        }
+                        await session.commit()
+                        logger.debug(f"Committed chunk ending at row {row_offset}")
+                        await progress.report(row_offset)
+                        if not processed.total_rows or row_offset >= job.total_rows:
+                            break
+                    # Columnar writers assemble their files here
+                    await asyncio.to_thread(result_writer.close)
+                    await asyncio.to_thread(failed_writer.close)
+                except JobLeaseLost:
+                    # The files now belong to the worker that took the job over
+                    raise
+                except Exception:
+                    result_writer.discard()
+                    failed_writer.discard()
+                    raise
+                except BaseException:
+                    # Interrupted: keep the files for the attempt that resumes
+                    result_writer.suspend()
+                    failed_writer.suspend()
+                    raise
+                # Spreadsheet row counts can include trailing blank rows
+                job.total_rows = row_offset
+
                 logger.info(
-                    f"All rows processed. Success: {len(processed_data)}, Failed: {len(failed_rows)}"
-                )  # Create result file
-                if processed_data:
-                    result_df = pd.DataFrame(processed_data)
-                    result_file_path = self.upload_dir / f"result_{job_id}.csv"
-                    result_df.to_csv(result_file_path, index=False)
+                    f"All rows processed. Success: {result_writer.rows_written}, "
+                    f"Failed: {failed_writer.rows_written}"
+                )
+                result_file_path = result_writer.written_path
+                if result_file_path:
                     logger.info(f"Result file created: {result_file_path}")
                 else:
-                    result_file_path = None
-                    logger.warning(
-                        "No data was successfully processed"
-                    )  # Create failed rows file if there are any failed rows
-                failed_file_path = None
-                if failed_rows:
-                    failed_df = pd.DataFrame(failed_rows)
-                    failed_file_path = self.upload_dir / f"failed_{job_id}.csv"
-                    failed_df.to_csv(failed_file_path, index=False)
+                    logger.warning("No data was successfully processed")
+                failed_file_path = failed_writer.written_path
+                if failed_file_path:
                     logger.info(
-                        f"Failed rows file created: {failed_file_path} with {len(failed_rows)} failed rows"
+                        f"Failed rows file created: {failed_file_path} with {failed_writer.rows_written} failed rows"
                     )
 
                 # Update job as completed
                 job.status = "completed"
+                job.checkpoint = None
                 job.result_file_path = (
                     str(result_file_path) if result_file_path else None
                 )
@@ -286,26 +365,24 @@ class DataUploadService:
                 job.completed_at = datetime.now(
                     timezone.utc
                 )  # Add summary of failed rows to error message if any
-                if failed_rows:
-                    failed_file_name = f"failed_{job_id}.csv"
-                    sample_errors = [
-                        f"Row {row['_row_number']}: {row['_error_reason'][:100]}"
-                        for row in failed_rows[:3]
-                    ]
+                if failed_file_path:
                     job.error_message = (
-                        f"Completed with {len(failed_rows)} failed rows. "
-                        f"See '{failed_file_name}' for details. "
+                        f"Completed with {failed_writer.rows_written} failed rows. "
+                        f"See '{failed_file_path.name}' for details. "
                         f"Sample errors: {'; '.join(sample_errors)}"
                     )
 
                 await session.commit()
                 logger.info(f"Job {job_id} completed successfully")
+                await progress.report(row_offset, force=True)
 
                 # Clean up original file
                 if file_path.exists():
                     file_path.unlink()
                     logger.debug(f"Cleaned up original file: {file_path}")
 
+            except JobLeaseLost:
+                raise
             except pd.errors.EmptyDataError:
                 logger.error(f"Empty file provided for job {job_id}")
                 raise ValueError("The uploaded file is empty or has no data")
@@ -324,6 +401,13 @@ class DataUploadService:
                 logger.error(f"Traceback: {traceback.format_exc()}")
                 raise ValueError(f"Processing failed: {str(e)}")
 
+        except JobLeaseLost:
+            logger.warning(f"Job {job_id} was taken over by another worker, stopping")
+            if session is not None:
+                await session.rollback()
+            # Leave the upload in place for the worker now processing it
+            file_path = None
+
         except Exception as e:
             # Final catch-all error handling
             error_msg = str(e)
@@ -334,21 +418,29 @@ class DataUploadService:
             if job is not None and session is not None:
                 try:
                     # Rollback any pending transaction
-                    await session.rollback()  # Update job status
+                    await session.rollback()
+                    # Rows from chunks stored before the failure are discarded
+                    await session.execute(
+                        delete(UploadedData).where(UploadedData.job_id == job_id)
+                    )  # Update job status
                     job.status = "failed"
+                    job.checkpoint = None
                     job.error_message = error_msg
                     from datetime import timezone
 
                     job.completed_at = datetime.now(timezone.utc)
                     await session.commit()
                     logger.info(f"Job {job_id} marked as failed")
+                    await JobProgressReporter(job).report(
+                        job.processed_rows or 0, force=True
+                    )
                 except Exception as commit_error:
                     logger.error(
                         f"Failed to update job status for {job_id}: {str(commit_error)}"
                     )
 
             # Clean up files
-            if file_path.exists():
+            if file_path is not None and file_path.exists():
                 try:
                     file_path.unlink()
                     logger.debug(f"Cleaned up file after error: {file_path}")
@@ -366,6 +458,171 @@ class DataUploadService:
                     logger.error(f"Error closing session: {str(close_error)}")
             logger.info(f"Background processing completed for job {job_id}")
 
+    async def _store_chunk(
+        self,
+        session: AsyncSession,
+        job: UploadJob,
+        templates: list[Template],
+        processed: ProcessedChunk,
+        expires_at: datetime,
+        on_progress: Callable[[int], Awaitable[None]] | None = None,
+    ) -> tuple[list[dict], list[dict]]:
+        """Insert a chunk's valid rows in batches, without committing.
+
+        on_progress is awaited after each batch with the number of the last
+        row handled. Returns the result-file rows, with each template's URL added, and the
+        failed-row records for rows that could not be stored.
+        """
+        result_rows = []
+        failed_rows = []
+        batch_size = settings.upload_insert_batch_size
+        for start in range(0, len(processed.rows), batch_size):
+            batch = processed.rows[start : start + batch_size]
+            records = [
+                {
+                    **row.storage,  # Payload with template-specific data
+                    "template_slugs": job.template_slugs,
+                    "expires_at": expires_at,
+                    "owner_id": job.owner_id,
+                    "job_id": job.id,
+                }
+                for row in batch
+            ]
+            digests = [row.identifier_digest for row in batch]
+            storage_errors = await self._store_batch(session, records, digests)
+
+            for index, (row, record) in enumerate(zip(batch, records)):
+                if index in storage_errors:
+                    failed_row = row.row_data.copy()
+                    failed_row["_row_number"] = row.row_number
+                    failed_row["_original_row_index"] = row.row_number - 1
+                    failed_row["_error_reason"] = storage_errors[index]
+                    failed_row["_error_type"] = "StorageError"
+                    failed_rows.append(failed_row)
+                    continue
+
+                # Add to processed data for result file with original row order preserved
+                processed_row = row.row_data.copy()
+                # Add template URLs with domain
+                for template in templates:
+                    processed_row[f"{template.name}_url"] = (
+                        f"{settings.domain}/{template.slug}/{record['identifier']}"
+                    )
+                result_rows.append(processed_row)
+
+            if on_progress is not None:
+                await on_progress(batch[-1].row_number)
+        return result_rows, failed_rows
+
+    @staticmethod
+    async def _lock_claimed_job(
+        session: AsyncSession, job: UploadJob, claimed_by: str | None
+    ) -> None:
+        """Lock the job row until the next commit, if this worker still holds it.
+
+        Raises JobLeaseLost once the job has been requeued or claimed by
+        another worker.
+        """
+        await session.refresh(job, ["status", "worker_id"], with_for_update=True)
+        if job.status != "processing" or job.worker_id != claimed_by:
+            raise JobLeaseLost(job.id)
+
+    @staticmethod
+    async def _load_job_templates(
+        session: AsyncSession, job: UploadJob
+    ) -> list[Template]:
+        """Load the job's templates in the order they were selected."""
+        result = await session.execute(
+            select(Template).where(Template.slug.in_(job.template_slugs))
+        )
+        templates = {template.slug: template for template in result.scalars()}
+        missing = [slug for slug in job.template_slugs if slug not in templates]
+        if missing:
+            raise ValueError(f"Templates no longer exist: {', '.join(missing)}")
+        return [templates[slug] for slug in job.template_slugs]
+
+    async def _store_batch(
+        self, session: AsyncSession, records: list[dict], digests: list[str]
+    ) -> dict[int, str]:
+        """Insert a batch without letting one bad row abort the others.
+
+        The batch is written inside a savepoint. If it fails (e.g. a deadlock
+        with a concurrent job, or a row the database rejects) the savepoint is
+        rolled back and the rows are retried one by one, each in its own
+        savepoint. Returns the error for every row that could not be stored,
+        keyed by its index in records.
+        """
+        try:
+            async with session.begin_nested():
+                candidates = [identifier_strategy.candidates(d) for d in digests]
+                return await self._insert_batch(session, records, candidates)
+        except DBAPIError as e:
+            logger.warning(f"Batch insert failed, retrying row by row: {e.orig}")
+
+        errors = {}
+        for index, record in enumerate(records):
+            try:
+                async with session.begin_nested():
+                    candidates = identifier_strategy.candidates(digests[index])
+                    if await self._insert_batch(session, [record], [candidates]):
+                        errors[index] = "Could not allocate a unique identifier"
+            except DBAPIError as e:
+                errors[index] = f"Failed to store row: {e.orig}"
+        return errors
+
+    @staticmethod
+    async def _insert_batch(
+        session: AsyncSession,
+        records: list[dict],
+        candidates: list[Iterator[str]],
+    ) -> set[int]:
+        """Insert UploadedData rows, letting the database arbitrate identifiers.
+
+        Each record walks its identifier candidates in order.
+        Rows are sent as multi-row INSERT ... ON CONFLICT (identifier) DO
+        NOTHING statements; the identifiers that come back in RETURNING were
+        stored, and the remaining rows are retried with their next candidate.
+        Nothing about the existing rows is loaded into memory, and concurrent
+        jobs can't hand out the same identifier. Sets each record's
+        "identifier" and returns the indexes of rows that ran out of
+        candidates.
+        """
+        statement = (
+            pg_insert(UploadedData)
+            .on_conflict_do_nothing(index_elements=[UploadedData.identifier])
+            .returning(UploadedData.identifier)
+        )
+        exhausted = set()
+        pending = list(range(len(records)))
+        while pending:
+            to_insert = {}
+            for index in pending:
+                identifier = next(candidates[index], None)
+                if identifier is None:
+                    exhausted.add(index)
+                    continue
+                records[index]["identifier"] = identifier
+                # Identical rows in one batch would share an identifier
+                to_insert.setdefault(identifier, index)
+
+            if not to_insert:
+                break
+
+            # Insert in identifier order so concurrent jobs take the unique
+            # index locks in the same order and can't deadlock each other
+            rows = [records[to_insert[identifier]] for identifier in sorted(to_insert)]
+            inserted = set(await session.scalars(statement, rows))
+            pending = [
+                index
+                for index in pending
+                if index not in exhausted
+                and (
+                    to_insert.get(records[index]["identifier"]) != index
+                    or records[index]["identifier"] not in inserted
+                )
+            ]
+        return exhausted
+
     async def get_upload_jobs(
         self, owner: User, skip: int = 0, limit: int = 100
     ) -> list[UploadJob]:
@@ -391,11 +648,39 @@ class DataUploadService:
             )
         return job
 
+    def _with_payloads(self, rows) -> list[UploadedData]:
+        """Decode packed payloads, from (UploadedData, payload_schema) rows.
+
+        The decoded payload is set on a detached copy of the row, so it is
+        never written back.
+        """
+        data_rows = []
+        for data, schema in rows:
+            if data.payload_blob is not None:
+                self.session.expunge(data)
+                try:
+                    data.payload = load_payload(data.payload, data.payload_blob, schema)
+                except ValueError as e:
+                    logger.error(f"Can't decode the payload of {data.identifier}: {e}")
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Stored data can't be decoded",
+                    )
+            data_rows.append(data)
+        return data_rows
+
+    def _select_with_payload_schema(self):
+        return select(UploadedData, UploadJob.payload_schema).outerjoin(
+            UploadJob, UploadJob.id == UploadedData.job_id
+        )
+
     async def get_uploaded_data_by_identifier(self, identifier: str) -> UploadedData:
         result = await self.session.execute(
-            select(UploadedData).where(UploadedData.identifier == identifier)
+            self._select_with_payload_schema().where(
+                UploadedData.identifier == identifier
+            )
         )
-        data = result.scalar_one_or_none()
+        data = next(iter(self._with_payloads(result.all())), None)
         if not data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Data not found"
@@ -409,6 +694,23 @@ class DataUploadService:
 
         return data
 
+    async def get_uploaded_data_for_template(
+        self, slug: str, owner: User, skip: int = 0, limit: int = 100
+    ) -> list[UploadedData]:
+        """The owner's unexpired rows associated with a template, newest first."""
+        result = await self.session.execute(
+            self._select_with_payload_schema()
+            .where(
+                UploadedData.has_template(slug),
+                UploadedData.owner_id == owner.id,
+                UploadedData.expires_at >= func.now(),
+            )
+            .order_by(UploadedData.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return self._with_payloads(result.all())
+
     async def get_user_recent_jobs(
         self, owner_id: uuid.UUID, limit: int = 10
     ) -> list[UploadJob]:
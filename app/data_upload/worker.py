@@ -0,0 +1,255 @@
+"""
+Upload ingestion workers.
+
+upload_jobs doubles as a durable queue. create_upload_job inserts a pending
+job and notifies UPLOAD_JOB_QUEUED_CHANNEL; workers claim pending jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can run on any node
+without two claiming the same job. The queue is also polled, so a missed
+notification only delays a job.
+
+While a job runs its worker refreshes heartbeat_at. A job whose heartbeat is
+older than the lease is treated as orphaned (its worker crashed or lost the
+database) and is put back in the queue, up to upload_job_max_attempts times.
+A worker that finds its lease taken over stops working on the job. Requeued
+jobs resume from the checkpoint committed with their last stored chunk.
+
+Workers read uploads from, and write result files to, the same upload
+directory as the web processes, so on separate nodes it must be shared.
+"""
+
+import asyncio
+from datetime import timedelta
+import logging
+import os
+import socket
+import uuid
+
+from app.config import settings
+from app.data_upload.models import UploadedData, UploadJob
+from app.data_upload.reaper import delete_job_files
+from app.data_upload.service import DataUploadService
+from app.database import async_session_maker
+from sqlalchemy import delete, func, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+
+class UploadWorker:
+    """Claims queued upload jobs and runs up to `concurrency` of them at once."""
+
+    def __init__(
+        self,
+        worker_id: str | None = None,
+        concurrency: int | None = None,
+        poll_interval: float | None = None,
+    ):
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.concurrency = concurrency or settings.upload_worker_concurrency
+        self.poll_interval = poll_interval or settings.upload_worker_poll_interval
+        self.lease = timedelta(seconds=settings.upload_job_lease_seconds)
+        self._wakeup = asyncio.Event()
+        self._jobs: dict[uuid.UUID, asyncio.Task] = {}
+        self._lost_jobs: set[uuid.UUID] = set()
+        self._task: asyncio.Task | None = None
+
+    def wake(self, payload: str = "") -> None:
+        """Check the queue now, e.g. when a job was just queued."""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            logger.info(
+                f"Upload worker {self.worker_id} started "
+                f"(concurrency {self.concurrency})"
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and hand running jobs back to the queue."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        jobs = list(self._jobs.values())
+        for task in jobs:
+            task.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        logger.info(f"Upload worker {self.worker_id} stopped")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.requeue_orphaned_jobs()
+                while len(self._jobs) < self.concurrency:
+                    job_id = await self.claim_job()
+                    if job_id is None:
+                        break
+                    self._jobs[job_id] = asyncio.create_task(self._run_job(job_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Upload worker {self.worker_id} poll failed: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+
+    async def claim_job(self) -> uuid.UUID | None:
+        """Atomically take the oldest pending job, or return None."""
+        next_job = (
+            select(UploadJob.id)
+            .where(UploadJob.status == "pending")
+            .order_by(UploadJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(UploadJob)
+                .where(UploadJob.id == next_job)
+                .values(
+                    status="processing",
+                    worker_id=self.worker_id,
+                    heartbeat_at=func.now(),
+                    attempts=UploadJob.attempts + 1,
+                )
+                .returning(UploadJob.id)
+                .execution_options(synchronize_session=False)
+            )
+            job_id = result.scalar_one_or_none()
+            await session.commit()
+
+        if job_id is not None:
+            logger.info(f"Worker {self.worker_id} claimed job {job_id}")
+        return job_id
+
+    async def requeue_orphaned_jobs(self) -> None:
+        """Requeue, or give up on, jobs whose worker stopped sending heartbeats.
+
+        A processing job without a heartbeat (e.g. one that was running when
+        heartbeats were introduced) counts as orphaned too. Jobs given up on
+        are cleaned up like any failed job: the rows their attempts stored,
+        their checkpoint, partial result files and the upload are deleted.
+        """
+        orphaned = (UploadJob.status == "processing") & or_(
+            UploadJob.heartbeat_at.is_(None),
+            UploadJob.heartbeat_at < func.now() - self.lease,
+        )
+        max_attempts = settings.upload_job_max_attempts
+        async with async_session_maker() as session:
+            failed = await session.execute(
+                update(UploadJob)
+                .where(orphaned & (UploadJob.attempts >= max_attempts))
+                .values(
+                    status="failed",
+                    worker_id=None,
+                    error_message=f"Job was abandoned by its worker {max_attempts} times",
+                    completed_at=func.now(),
+                    checkpoint=None,
+                )
+                .returning(UploadJob)
+                .execution_options(synchronize_session=False)
+            )
+            failed_jobs = failed.scalars().all()
+            if failed_jobs:
+                await session.execute(
+                    delete(UploadedData).where(
+                        UploadedData.job_id.in_([job.id for job in failed_jobs])
+                    )
+                )
+            requeued = await session.execute(
+                update(UploadJob)
+                .where(orphaned & (UploadJob.attempts < max_attempts))
+                .values(status="pending", worker_id=None, heartbeat_at=None)
+                .returning(UploadJob.id)
+                .execution_options(synchronize_session=False)
+            )
+            requeued_ids = requeued.scalars().all()
+            await session.commit()
+
+        for job in failed_jobs:
+            logger.error(f"Job {job.id} failed after {max_attempts} abandoned attempts")
+            await asyncio.to_thread(delete_job_files, job)
+        for job_id in requeued_ids:
+            logger.warning(f"Requeued orphaned job {job_id}")
+
+    async def _run_job(self, job_id: uuid.UUID) -> None:
+        heartbeat = asyncio.create_task(
+            self._send_heartbeats(job_id, asyncio.current_task())
+        )
+        try:
+            async with async_session_maker() as session:
+                await DataUploadService(session).process_upload_job(job_id)
+        except asyncio.CancelledError:
+            if job_id in self._lost_jobs:
+                logger.warning(f"Stopped job {job_id} after losing its lease")
+            else:
+                await self._release_job(job_id)
+                raise
+        except Exception as e:
+            logger.error(f"Job {job_id} crashed in worker {self.worker_id}: {e}")
+        finally:
+            heartbeat.cancel()
+            self._jobs.pop(job_id, None)
+            self._lost_jobs.discard(job_id)
+            self._wakeup.set()
+
+    async def _send_heartbeats(self, job_id: uuid.UUID, job_task: asyncio.Task):
+        interval = self.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with async_session_maker() as session:
+                    result = await session.execute(
+                        update(UploadJob)
+                        .where(
+                            UploadJob.id == job_id,
+                            UploadJob.worker_id == self.worker_id,
+                        )
+                        .values(heartbeat_at=func.now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+                continue
+
+            if result.rowcount == 0:
+                # The lease expired and the job was requeued or taken over
+                self._lost_jobs.add(job_id)
+                job_task.cancel()
+                return
+
+    async def _release_job(self, job_id: uuid.UUID) -> None:
+        """Put a job this worker was stopped during back in the queue."""
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    update(UploadJob)
+                    .where(
+                        UploadJob.id == job_id,
+                        UploadJob.worker_id == self.worker_id,
+                        UploadJob.status == "processing",
+                    )
+                    .values(
+                        status="pending",
+                        worker_id=None,
+                        heartbeat_at=None,
+                        # A shutdown doesn't count against the job's attempts
+                        attempts=UploadJob.attempts - 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            logger.info(f"Released job {job_id} back to the queue")
+        except Exception as e:
+            logger.warning(f"Failed to release job {job_id}, it will be requeued: {e}")
@@ -0,0 +1,276 @@
+"""
+Incremental writers for the result and failed-row files of an upload job.
+
+Rows are appended chunk by chunk as the job progresses, so the files never
+have to be built in memory. A file is only created once the first row is
+written. Until close() the rows go to a `.partial` file next to it, so a
+half-written or soon-to-be-discarded file is never downloadable under the
+result's name.
+
+Results can be written as CSV, Parquet or Arrow IPC (see RESULT_FORMATS).
+The columnar formats need pyarrow.
+
+checkpoint() describes what has been written so far; a resumed job hands
+that state to resume() to drop anything written after the checkpoint and
+carry on appending.
+"""
+
+import os
+from pathlib import Path
+import shutil
+from typing import Any
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency
+    pa = None
+    pq = None
+
+# Result file format -> file extension
+RESULT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _partial_path(path: Path) -> Path:
+    return path.with_name(path.name + ".partial")
+
+
+class CsvRowWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.partial_path = _partial_path(path)
+        self.rows_written = 0
+        self._columns: list[str] | None = None
+        self._handle = None
+
+    @property
+    def written_path(self) -> Path | None:
+        """The file's path, or None if no rows were written."""
+        return self.path if self.rows_written else None
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._handle is None:
+            self._handle = open(self.partial_path, "w", newline="")
+            # Every chunk has the same columns, in the order of the first row
+            self._columns = list(rows[0])
+        pd.DataFrame(rows, columns=self._columns).to_csv(
+            self._handle, header=self.rows_written == 0, index=False
+        )
+        self.rows_written += len(rows)
+
+    def checkpoint(self) -> dict[str, Any]:
+        size = 0
+        if self._handle is not None:
+            self._handle.flush()
+            size = os.fstat(self._handle.fileno()).st_size
+        return {
+            "rows_written": self.rows_written,
+            "columns": self._columns,
+            "size": size,
+        }
+
+    def resume(self, state: dict[str, Any]) -> None:
+        """Truncate the file back to the checkpoint and reopen it for appending."""
+        if not state["rows_written"]:
+            self.partial_path.unlink(missing_ok=True)
+            return
+        if (
+            not self.partial_path.exists()
+            or self.partial_path.stat().st_size < state["size"]
+        ):
+            raise ValueError(f"{self.partial_path.name} is missing checkpointed rows")
+        os.truncate(self.partial_path, state["size"])
+        self._handle = open(self.partial_path, "a", newline="")
+        self._columns = state["columns"]
+        self.rows_written = state["rows_written"]
+
+    def close(self) -> None:
+        """Finish the file, moving it to its final name."""
+        self._close_handle()
+        if self.rows_written:
+            os.replace(self.partial_path, self.path)
+
+    def _close_handle(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def suspend(self) -> None:
+        """Close the file, keeping it for a resumed job."""
+        self._close_handle()
+
+    def discard(self) -> None:
+        """Close and delete the partially written file, starting over."""
+        self._close_handle()
+        self.partial_path.unlink(missing_ok=True)
+        self.path.unlink(missing_ok=True)
+        self.rows_written = 0
+        self._columns = None
+
+
+class ColumnarRowWriter:
+    """Writes rows to a Parquet or Arrow IPC file.
+
+    A column's type is only known once every chunk has been seen: it can
+    be all null in the first chunk, or hold ints in one chunk and floats or
+    strings in the next. Each chunk is therefore spilled to its own Arrow
+    IPC file in a `.parts` directory next to the result, and close()
+    streams the parts into the final file under one unified schema.
+    """
+
+    def __init__(self, path: Path, result_format: str):
+        self.path = path
+        self.result_format = result_format
+        self.parts_dir = path.with_name(path.name + ".parts")
+        self.rows_written = 0
+        self._columns: list[str] | None = None
+        self._parts: list[Path] = []
+
+    @property
+    def written_path(self) -> Path | None:
+        """The file's path, or None if no rows were written."""
+        return self.path if self.rows_written else None
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._columns is None:
+            self.parts_dir.mkdir(exist_ok=True)
+            self._columns = list(rows[0])
+
+        table = pa.table(
+            {
+                column: _column_array([row.get(column) for row in rows])
+                for column in self._columns
+            }
+        )
+        part = self.parts_dir / f"{len(self._parts):06d}.arrow"
+        with pa.ipc.new_file(str(part), table.schema) as part_writer:
+            part_writer.write_table(table)
+        self._parts.append(part)
+        self.rows_written += len(rows)
+
+    def checkpoint(self) -> dict[str, Any]:
+        # Parts are complete files once write() returns
+        return {
+            "rows_written": self.rows_written,
+            "columns": self._columns,
+            "parts": len(self._parts),
+        }
+
+    def resume(self, state: dict[str, Any]) -> None:
+        """Keep the checkpointed parts and drop any written after them."""
+        self.path.unlink(missing_ok=True)
+        parts = [
+            self.parts_dir / f"{index:06d}.arrow" for index in range(state["parts"])
+        ]
+        if not all(part.exists() for part in parts):
+            raise ValueError(f"{self.parts_dir.name} is missing checkpointed parts")
+        if not parts:
+            self._remove_parts()
+            return
+        for part in self.parts_dir.iterdir():
+            if part not in parts:
+                part.unlink()
+        self._parts = parts
+        self._columns = state["columns"]
+        self.rows_written = state["rows_written"]
+
+    def close(self) -> None:
+        """Combine the spilled chunks into the result file."""
+        if not self._parts:
+            return
+        schemas = []
+        for part in self._parts:
+            with pa.memory_map(str(part)) as source:
+                schemas.append(pa.ipc.open_file(source).schema)
+        schema = pa.schema(
+            [
+                pa.field(
+                    column,
+                    unify_column_types([s.field(column).type for s in schemas]),
+                )
+                for column in self._columns
+            ]
+        )
+
+        partial_path = _partial_path(self.path)
+        if self.result_format == "parquet":
+            writer = pq.ParquetWriter(str(partial_path), schema)
+        else:
+            writer = pa.ipc.new_file(str(partial_path), schema)
+        with writer:
+            for part in self._parts:
+                # Memory-mapped, so only one chunk is paged in at a time
+                with pa.memory_map(str(part)) as source:
+                    table = pa.ipc.open_file(source).read_all()
+                    writer.write_table(table.cast(schema))
+        os.replace(partial_path, self.path)
+        self._remove_parts()
+
+    def suspend(self) -> None:
+        """Nothing to close: each part is complete once written."""
+
+    def discard(self) -> None:
+        """Delete the partially written file and its parts, starting over."""
+        self._remove_parts()
+        _partial_path(self.path).unlink(missing_ok=True)
+        self.path.unlink(missing_ok=True)
+        self.rows_written = 0
+        self._columns = None
+
+    def _remove_parts(self) -> None:
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        self._parts = []
+
+
+def _column_array(values: list[Any]):
+    """Build an Arrow array, falling back to strings for mixed-type columns."""
+    try:
+        # from_pandas treats NaN as null, as pandas does
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(
+            [None if pd.isna(value) else str(value) for value in values],
+            type=pa.string(),
+        )
+
+
+def unify_column_types(types: list) -> "pa.DataType":
+    """The type a column's values from every chunk can be cast to.
+
+    Chunks where the column is all null don't constrain it, integers widen
+    to int64 and mixed ints and floats to float64. Anything else that
+    disagrees is written as strings.
+    """
+    types = {t for t in types if not pa.types.is_null(t)}
+    if not types:
+        return pa.null()
+    if len(types) == 1:
+        return types.pop()
+    if all(pa.types.is_integer(t) for t in types):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    return pa.string()
+
+
+def open_row_writer(path_stem: Path, result_format: str):
+    """Create the writer for `path_stem` plus the format's extension."""
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(
+            f"Unknown result format '{result_format}'. "
+            f"Available: {', '.join(RESULT_FORMATS)}"
+        )
+    path = path_stem.with_name(path_stem.name + RESULT_FORMATS[result_format])
+    if result_format == "csv":
+        return CsvRowWriter(path)
+    if pa is None:
+        raise ValueError(
+            f"Writing {result_format} files requires pyarrow (the columnar extra)"
+        )
+    return ColumnarRowWriter(path, result_format)
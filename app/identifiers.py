@@ -0,0 +1,163 @@
+"""
+Identifier schemes for uploaded rows.
+
+An identifier is allocated in two steps. digests() runs once per chunk in the
+upload process pool and does the expensive part (canonical serialization and
+hashing) for every row. candidates() then turns one digest into the sequence
+of identifiers to try; the database arbitrates uniqueness and the next
+candidate is only used when the previous one conflicts.
+
+Available strategies:
+
+- sha256: the original scheme, hex prefixes of a SHA-256 over the payload.
+- blake2: base62 prefixes of a BLAKE2b digest of the canonical JSON payload.
+  Each character carries ~6 bits instead of 4, so short prefixes collide far
+  less often.
+- random: random base62 strings of a fixed length, for links that must not
+  be derivable from the data.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+import hashlib
+import secrets
+import string
+from typing import Any
+
+from app.config import settings
+import numpy as np
+import ujson
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+_BASE62_CODES = np.frombuffer(BASE62_ALPHABET.encode(), dtype=np.uint8)
+
+
+def base62_digests(digests: list[bytes]) -> list[str]:
+    """Encode a batch of 16-byte digests as 22-character base62 strings.
+
+    Each 64-bit half becomes 11 base62 digits, least significant first, so
+    every prefix is uniformly distributed. The arithmetic runs over the whole
+    batch at once with numpy.
+    """
+    halves = np.frombuffer(b"".join(digests), dtype=">u8").reshape(-1, 2)
+    codes = np.empty((len(digests), 22), dtype=np.uint8)
+    for half in range(2):
+        values = halves[:, half].astype(np.uint64)
+        for position in range(11):
+            values, remainders = np.divmod(values, np.uint64(62))
+            codes[:, half * 11 + position] = _BASE62_CODES[remainders]
+    return codes.view("S22").ravel().astype(str).tolist()
+
+
+def random_base62(length: int) -> str:
+    return "".join(secrets.choice(BASE62_ALPHABET) for _ in range(length))
+
+
+def canonical_json(data: Any) -> bytes:
+    """Serialize data so equal payloads always produce the same bytes."""
+    return ujson.dumps(
+        data, sort_keys=True, ensure_ascii=False, escape_forward_slashes=False
+    ).encode()
+
+
+class IdentifierStrategy(ABC):
+    name: str
+
+    def __init__(self, min_length: int = 6, max_length: int = 32):
+        self.min_length = min_length
+        self.max_length = max_length
+
+    @abstractmethod
+    def digests(self, payloads: list[dict[str, Any]]) -> list[str]:
+        """Compute the digest of each row's payload."""
+
+    def candidates(self, digest: str, random_attempts: int = 100) -> Iterator[str]:
+        """Yield identifiers for a row, in the order they should be tried.
+
+        Increasingly long prefixes of the digest come first, then the longest
+        prefix that leaves room for a random suffix.
+        """
+        max_length = min(self.max_length, len(digest))
+        for length in range(self.min_length, max_length + 1):
+            yield digest[:length]
+
+        base_identifier = digest[: self.max_length - 4]
+        for _ in range(random_attempts):
+            yield base_identifier + self._random_suffix(4)
+
+    def _random_suffix(self, length: int) -> str:
+        return random_base62(length)
+
+
+class Sha256Strategy(IdentifierStrategy):
+    """Hex SHA-256 of the payload's repr, as identifiers were generated before."""
+
+    name = "sha256"
+
+    def digests(self, payloads: list[dict[str, Any]]) -> list[str]:
+        return [
+            hashlib.sha256(str(sorted(payload.items())).encode()).hexdigest()
+            for payload in payloads
+        ]
+
+    def _random_suffix(self, length: int) -> str:
+        return "".join(
+            secrets.choice(string.ascii_lowercase + string.digits)
+            for _ in range(length)
+        )
+
+
+class Blake2Strategy(IdentifierStrategy):
+    """Base62 BLAKE2b digest of the canonical JSON payload."""
+
+    name = "blake2"
+
+    def digests(self, payloads: list[dict[str, Any]]) -> list[str]:
+        return base62_digests(
+            [
+                hashlib.blake2b(canonical_json(payload), digest_size=16).digest()
+                for payload in payloads
+            ]
+        )
+
+
+class RandomStrategy(IdentifierStrategy):
+    """Random base62 identifiers of min_length, growing only after conflicts."""
+
+    name = "random"
+
+    def digests(self, payloads: list[dict[str, Any]]) -> list[str]:
+        return [""] * len(payloads)
+
+    def candidates(self, digest: str, random_attempts: int = 100) -> Iterator[str]:
+        for attempt in range(random_attempts):
+            # A few conflicts at one length mean that length is getting crowded
+            yield random_base62(min(self.min_length + attempt // 3, self.max_length))
+
+
+IDENTIFIER_STRATEGIES: dict[str, type[IdentifierStrategy]] = {
+    strategy.name: strategy
+    for strategy in (Sha256Strategy, Blake2Strategy, RandomStrategy)
+}
+
+
+def get_identifier_strategy(
+    name: str, min_length: int = 6, max_length: int = 32
+) -> IdentifierStrategy:
+    try:
+        strategy = IDENTIFIER_STRATEGIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown identifier strategy '{name}'. "
+            f"Available: {', '.join(IDENTIFIER_STRATEGIES)}"
+        )
+    return strategy(min_length=min_length, max_length=max_length)
+
+
+identifier_strategy = get_identifier_strategy(
+    settings.identifier_strategy,
+    settings.identifier_min_length,
+    settings.identifier_max_length,
+)
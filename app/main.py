@@ -4,9 +4,17 @@ from pathlib import Path
 
 from app.auth.config import auth_backend, fastapi_users
 from app.config import settings
+from app.data_upload.events import register_upload_events
+from app.data_upload.processing import shutdown_process_pool
+from app.data_upload.reaper import DataReaper
 from app.data_upload.routes import router as data_upload_router
+from app.data_upload.service import UPLOAD_JOB_QUEUED_CHANNEL
+from app.data_upload.worker import UploadWorker
 from app.logging_config import setup_logging
+from app.notifications import notification_listener
 from app.public.routes import router as public_router
+from app.templates.cache import template_cache
+from app.templates.events import register_template_events
 from app.templates.routes import router as templates_router
 from app.users.routes import router as users_router
 from app.users.schemas import UserRead, UserUpdate
@@ -26,8 +34,34 @@ log = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     log.info("Starting Templr application...")
+    if settings.template_cache_warmup:
+        try:
+            compiled = await template_cache.warm_up()
+            log.info(f"Template cache warmed up with {compiled} templates")
+        except Exception as e:
+            log.warning(f"Template cache warm-up failed: {e}")
+
+    register_template_events(notification_listener)
+    register_upload_events(notification_listener)
+    upload_worker = None
+    if settings.upload_embedded_worker:
+        upload_worker = UploadWorker()
+        notification_listener.subscribe(UPLOAD_JOB_QUEUED_CHANNEL, upload_worker.wake)
+    await notification_listener.start()
+    if upload_worker is not None:
+        await upload_worker.start()
+    data_reaper = None
+    if settings.data_reaper_interval:
+        data_reaper = DataReaper()
+        await data_reaper.start()
     yield
     log.info("Shutting down Templr application...")
+    if data_reaper is not None:
+        await data_reaper.stop()
+    if upload_worker is not None:
+        await upload_worker.stop()
+    await notification_listener.stop()
+    shutdown_process_pool()
 
 
 app = FastAPI(
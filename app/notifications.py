@@ -0,0 +1,106 @@
+"""
+Postgres LISTEN/NOTIFY plumbing shared by every worker and node.
+
+Publishers call notify() inside their transaction, so the message is only
+delivered once the change is committed. Each process runs one listener on a
+dedicated asyncpg connection and dispatches payloads to the handlers that
+subscribed to a channel.
+"""
+
+import asyncio
+from collections import defaultdict
+from collections.abc import Callable
+import logging
+
+from app.config import settings
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+async def notify(session: AsyncSession, channel: str, payload: str) -> None:
+    """Queue a notification that is sent when the session's transaction commits."""
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """Convert the SQLAlchemy database URL into a plain asyncpg DSN."""
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+class NotificationListener:
+    """Keeps a LISTEN connection open and reconnects when it drops."""
+
+    def __init__(self, dsn: str, retry_delay: float = 5.0):
+        self.dsn = dsn
+        self.retry_delay = retry_delay
+        self._handlers: dict[str, list[Callable[[str], None]]] = defaultdict(list)
+        self._reconnect_handlers: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]) -> None:
+        """Call handler with the payload of every notification on channel."""
+        self._handlers[channel].append(handler)
+
+    def on_reconnect(self, handler: Callable[[], None]) -> None:
+        """Call handler after a dropped connection is re-established.
+
+        Notifications sent while disconnected are lost, so subscribers use
+        this to discard any state that could have gone stale.
+        """
+        self._reconnect_handlers.append(handler)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                for channel in self._handlers:
+                    await connection.add_listener(channel, self._dispatch)
+                logger.info(f"Listening for notifications on {list(self._handlers)}")
+
+                if connected_before:
+                    for handler in self._reconnect_handlers:
+                        handler()
+                connected_before = True
+
+                await closed.wait()
+                logger.warning("Notification connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Notification listener error: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.retry_delay)
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Notification handler for {channel} failed: {e}")
+
+
+notification_listener = NotificationListener(asyncpg_dsn(settings.database_url))
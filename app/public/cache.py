@@ -0,0 +1,206 @@
+"""
+Rendered-page and negative caches for the public render path.
+
+A page for a given (slug, identifier) only changes when its template is edited
+or its data expires, so the rendered HTML is kept in a byte-bounded LRU and
+served without touching the database. Entries are dropped when the template is
+updated or deleted in this worker, and are trusted for at most
+render_cache_ttl seconds. Workers on other nodes learn about template edits
+through the template change notifications (see app.templates.events).
+
+Lookups that end in a 404 or 410 are remembered in a separate negative cache,
+so repeated bot scans, typos and expired links are answered without a query.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+import math
+import time
+import uuid
+
+from app.cache import LRUCache
+from app.config import settings
+
+
+@dataclass
+class RenderedPage:
+    template_id: str
+    template_version: int
+    body: bytes
+    etag: str
+    expires_at: datetime
+    cached_at: float = field(default_factory=time.monotonic)
+
+    def is_fresh(self, ttl: int) -> bool:
+        return (
+            time.monotonic() - self.cached_at < ttl
+            and datetime.now(timezone.utc) < self.expires_at
+        )
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag for a rendered page body."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against the page's ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_control(expires_at: datetime) -> str:
+    """Cache-Control value that never lets clients keep a page past its expiry.
+
+    Pages hold a recipient's personal data, so only their browser may cache
+    them, never a shared proxy or CDN.
+    """
+    remaining = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+    max_age = max(0, min(remaining, settings.render_cache_control_max_age))
+    return f"private, max-age={max_age}"
+
+
+class RenderedPageCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.ttl = ttl
+        self._pages = LRUCache(
+            max_entries, max_bytes=max_bytes, sizeof=lambda page: len(page.body)
+        )
+        # Latest version announced for each template (inf once deleted), so
+        # a page rendered from an older version while the notification was
+        # handled isn't stored after the invalidation
+        self._latest_versions = LRUCache(max_entries)
+
+    def get(self, slug: str, identifier: str) -> RenderedPage | None:
+        page = self._pages.get((slug, identifier))
+        if page is None:
+            return None
+        if not page.is_fresh(self.ttl):
+            self._pages.pop((slug, identifier))
+            return None
+        return page
+
+    def store(
+        self,
+        slug: str,
+        identifier: str,
+        template_id: uuid.UUID | str,
+        template_version: int,
+        html: str,
+        expires_at: datetime,
+    ) -> RenderedPage:
+        """Cache a rendered page, unless its template has changed since."""
+        body = html.encode()
+        page = RenderedPage(
+            template_id=str(template_id),
+            template_version=template_version,
+            body=body,
+            etag=make_etag(body),
+            expires_at=expires_at,
+        )
+        if template_version >= self._latest_versions.get(page.template_id, 0):
+            self._pages.set((slug, identifier), page)
+        return page
+
+    def invalidate_template(
+        self, template_id: uuid.UUID | str, version: int | None = None
+    ) -> None:
+        """Drop pages rendered with the given template.
+
+        When a version is given only pages rendered from older versions are
+        dropped; otherwise every page for the template goes.
+        """
+        template_id = str(template_id)
+        latest = math.inf if version is None else version
+        self._latest_versions.set(
+            template_id, max(latest, self._latest_versions.get(template_id, 0))
+        )
+        self._pages.discard_where(
+            lambda _, page: page.template_id == template_id
+            and (version is None or page.template_version < version)
+        )
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+@dataclass
+class Miss:
+    status_code: int
+    detail: str
+    cached_at: float = field(default_factory=time.monotonic)
+
+
+class NegativeCache:
+    """Bounded cache of lookups known to fail.
+
+    Misses are scoped to what caused them: an unknown slug fails for every
+    identifier, an unknown or expired identifier fails for every slug, and
+    the remaining errors only apply to the exact (slug, identifier) pair.
+    Entries live for at most ttl seconds, which bounds how long a newly
+    uploaded identifier can keep returning 404 in this worker. Keys are
+    tagged with the kind of miss, so a slug can never be mistaken for an
+    identifier.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.ttl = ttl
+        self._misses = LRUCache(max_entries)
+
+    def get(self, slug: str, identifier: str) -> Miss | None:
+        for key in (
+            ("slug", slug),
+            ("identifier", identifier),
+            ("page", slug, identifier),
+        ):
+            miss = self._misses.get(key)
+            if miss is None:
+                continue
+            if time.monotonic() - miss.cached_at < self.ttl:
+                return miss
+            self._misses.pop(key)
+        return None
+
+    def remember_slug(self, slug: str, status_code: int, detail: str) -> Miss:
+        return self._remember(("slug", slug), status_code, detail)
+
+    def remember_identifier(
+        self, identifier: str, status_code: int, detail: str
+    ) -> Miss:
+        return self._remember(("identifier", identifier), status_code, detail)
+
+    def remember_page(
+        self, slug: str, identifier: str, status_code: int, detail: str
+    ) -> Miss:
+        return self._remember(("page", slug, identifier), status_code, detail)
+
+    def _remember(self, key: tuple, status_code: int, detail: str) -> Miss:
+        miss = Miss(status_code, detail)
+        self._misses.set(key, miss)
+        return miss
+
+    def forget_slug(self, slug: str) -> None:
+        """Drop misses involving a slug, e.g. after a template takes it."""
+        self._misses.discard_where(
+            lambda key, _: key == ("slug", slug) or key[:2] == ("page", slug)
+        )
+
+    def clear(self) -> None:
+        self._misses.clear()
+
+
+render_cache = RenderedPageCache(
+    settings.render_cache_max_entries,
+    settings.render_cache_max_bytes,
+    settings.render_cache_ttl,
+)
+
+negative_cache = NegativeCache(
+    settings.negative_cache_max_entries, settings.negative_cache_ttl
+)
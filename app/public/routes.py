@@ -1,10 +1,8 @@
-from datetime import datetime
-
-from app.data_upload.service import DataUploadService
 from app.database import get_async_session
-from app.templates.service import TemplateService
-from app.utils import render_template
-from fastapi import APIRouter, Depends, HTTPException, status
+from app.public.cache import cache_control, etag_matches, render_cache
+from app.public.service import PublicRenderService
+from app.utils import parse_stored_value, render_template
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRoute
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -38,48 +36,49 @@ router = APIRouter(tags=["public"], route_class=SafeHTMLRoute)
 
 @router.get("/{full_path:path}", response_class=HTMLResponse)
 async def render_template_with_data(
-    full_path: str, session: AsyncSession = Depends(get_async_session)
+    full_path: str, request: Request, session: AsyncSession = Depends(get_async_session)
 ):
     """Public endpoint to render templates with uploaded data."""
-    template_service = TemplateService(session)
-    data_service = DataUploadService(session)
-
     *slugs, identifier = full_path.strip("/").split("/")
     slug = "/".join(slugs)
 
-    # Get template
-    template = await template_service.get_template_by_slug(slug)
-
-    # Get data
-    uploaded_data = await data_service.get_uploaded_data_by_identifier(
-        identifier
-    )  # Verify the template slug is associated with this data
-    if slug not in uploaded_data.template_slugs:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Template not associated with this data",
-        )
-
-    # Render template
-    try:
-        if slug not in uploaded_data.payload:
+    page = render_cache.get(slug, identifier)
+    if page is None:
+        # Get template and data in one query
+        service = PublicRenderService(session)
+        context = await service.get_render_context(slug, identifier)
+        template = context.template
+
+        # Render template
+        try:
+            # Convert JSON-serialized data back to template-ready format with datetime objects
+            template_data = context.payload
+            if not context.payload_ready:
+                template_data = convert_payload_to_template_ready(
+                    context.payload, template.variables
+                )
+            rendered_html = render_template(
+                template.content, template_data, template_id=template.id
+            )
+        except ValueError as e:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Template payload not found",
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
             )
-        template_payload = uploaded_data.payload[slug]
 
-        # Convert JSON-serialized data back to template-ready format with datetime objects
-        template_data = convert_payload_to_template_ready(
-            template_payload, template.variables
-        )
-        rendered_html = render_template(template.content, template_data)
-        return HTMLResponse(content=rendered_html)
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        page = render_cache.store(
+            slug,
+            identifier,
+            template_id=template.id,
+            template_version=template.version,
+            html=rendered_html,
+            expires_at=context.expires_at,
         )
 
+    headers = {"ETag": page.etag, "Cache-Control": cache_control(page.expires_at)}
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return HTMLResponse(content=page.body, headers=headers)
+
 
 def convert_payload_to_template_ready(payload: dict, template_variables: list) -> dict:
     """Convert JSON payload back to template-ready format, parsing datetime strings back to datetime objects."""
@@ -90,18 +89,7 @@ def convert_payload_to_template_ready(payload: dict, template_variables: list) -
         var_type = var_def["type"]
         var_type_lookup[var_name] = var_type
 
-    result = {}
-    for key, value in payload.items():
-        var_type = var_type_lookup.get(key, None)
-
-        # Convert datetime strings back to datetime objects for template rendering
-        if var_type == "date" and isinstance(value, str):
-            try:
-                # Parse ISO format datetime strings back to datetime objects
-                result[key] = datetime.fromisoformat(value.replace("Z", "+00:00"))
-            except (ValueError, TypeError):
-                result[key] = value  # Keep original if parsing fails
-        else:
-            result[key] = value
-
-    return result
+    return {
+        key: parse_stored_value(value, var_type_lookup.get(key))
+        for key, value in payload.items()
+    }
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+from typing import Any
+
+from app.data_upload.models import UploadedData, UploadJob
+from app.data_upload.payloads import (
+    decode_values,
+    template_payload,
+    template_ready_payload,
+)
+from app.public.cache import Miss, negative_cache
+from app.templates.models import Template
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderContext:
+    """Everything the public route needs to render one page."""
+
+    template: Template
+    identifier: str
+    payload: dict[str, Any]
+    expires_at: datetime
+    # Packed payloads come typed from their job's schema, ready to render
+    payload_ready: bool = False
+
+
+def _http_error(miss: Miss) -> HTTPException:
+    return HTTPException(status_code=miss.status_code, detail=miss.detail)
+
+
+class PublicRenderService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_render_context(self, slug: str, identifier: str) -> RenderContext:
+        """Fetch the template and its data row in a single round-trip.
+
+        Expiry and slug membership are evaluated by the database alongside the
+        lookup, and only this template's slice of the payload (merged with the
+        variables it shares with other templates) is selected, so
+        multi-template rows never ship data the page won't render. Packed
+        rows are decoded here, with the template's columns and their types
+        from the job's payload_schema. Lookups that already failed recently
+        are answered from the negative cache.
+        """
+        miss = negative_cache.get(slug, identifier)
+        if miss is not None:
+            raise _http_error(miss)
+
+        result = await self.session.execute(
+            select(
+                Template,
+                UploadedData.id,
+                UploadedData.expires_at,
+                template_payload(UploadedData.payload, slug).label("payload"),
+                UploadedData.payload_blob,
+                UploadJob.payload_schema["templates"][slug].label("payload_columns"),
+                UploadJob.payload_schema["columns"].label("schema_columns"),
+                (UploadedData.expires_at < func.now()).label("expired"),
+                UploadedData.has_template(slug).label("has_slug"),
+            )
+            .select_from(Template)
+            .outerjoin(UploadedData, UploadedData.identifier == identifier)
+            .outerjoin(UploadJob, UploadJob.id == UploadedData.job_id)
+            .where(Template.slug == slug)
+        )
+        row = result.one_or_none()
+        if row is None:
+            raise _http_error(
+                negative_cache.remember_slug(
+                    slug, status.HTTP_404_NOT_FOUND, "Template not found"
+                )
+            )
+
+        (
+            template,
+            data_id,
+            expires_at,
+            payload,
+            payload_blob,
+            payload_columns,
+            schema_columns,
+            expired,
+            has_slug,
+        ) = row
+        if data_id is None:
+            raise _http_error(
+                negative_cache.remember_identifier(
+                    identifier, status.HTTP_404_NOT_FOUND, "Data not found"
+                )
+            )
+        if expired:
+            raise _http_error(
+                negative_cache.remember_identifier(
+                    identifier, status.HTTP_410_GONE, "Data has expired"
+                )
+            )
+        if not has_slug:
+            raise _http_error(
+                negative_cache.remember_page(
+                    slug,
+                    identifier,
+                    status.HTTP_404_NOT_FOUND,
+                    "Template not associated with this data",
+                )
+            )
+        payload_ready = False
+        if payload_blob is not None and payload_columns is not None:
+            try:
+                payload = template_ready_payload(
+                    decode_values(payload_blob), schema_columns, payload_columns
+                )
+            except ValueError as e:
+                # Not cached: installing the missing codec fixes it
+                logger.error(f"Can't decode the payload of {identifier}: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Stored data can't be decoded",
+                )
+            payload_ready = True
+        if payload is None:
+            raise _http_error(
+                negative_cache.remember_page(
+                    slug,
+                    identifier,
+                    status.HTTP_404_NOT_FOUND,
+                    "Template payload not found",
+                )
+            )
+
+        return RenderContext(
+            template=template,
+            identifier=identifier,
+            payload=payload,
+            expires_at=expires_at,
+            payload_ready=payload_ready,
+        )
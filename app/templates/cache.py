@@ -0,0 +1,110 @@
+"""
+Compiled Jinja2 template cache for the public render path.
+
+Templates are compiled once per worker and reused until the template content
+changes or the template is updated/deleted through TemplateService. When a
+bytecode cache directory is configured, the compiled code is also written to
+disk so other workers and restarted processes skip the compile step.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+import uuid
+
+from app.cache import LRUCache
+from app.config import settings
+from app.database import async_session_maker
+from app.templates.models import Template as TemplateModel
+from jinja2 import (
+    BytecodeCache,
+    Environment,
+    FileSystemBytecodeCache,
+    Template,
+    TemplateError,
+)
+from sqlalchemy import select
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: str) -> str:
+    """Stable hash of a template's source used in cache keys."""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class TemplateCache:
+    """LRU cache of compiled templates keyed by template id and content hash."""
+
+    def __init__(self, max_entries: int, bytecode_cache: BytecodeCache | None = None):
+        self.environment = Environment(bytecode_cache=bytecode_cache)
+        self._compiled = LRUCache(max_entries)
+
+    def get(self, template_id: uuid.UUID | str, content: str) -> Template:
+        """Return the compiled template, compiling it on a cache miss."""
+        key = (str(template_id), content_hash(content))
+        template = self._compiled.get(key)
+        if template is None:
+            template = self._compile(str(template_id), content)
+            self._compiled.set(key, template)
+            logger.debug(
+                f"Compiled template {template_id} ({len(self._compiled)} cached)"
+            )
+        return template
+
+    def _compile(self, name: str, content: str) -> Template:
+        """Compile a template, going through the bytecode cache when enabled."""
+        env = self.environment
+        bytecode_cache = env.bytecode_cache
+        if bytecode_cache is None:
+            return env.from_string(content)
+
+        # Same steps jinja2's loaders take; the bucket is keyed by name and a
+        # checksum of the source, so edited templates never load stale code.
+        bucket = bytecode_cache.get_bucket(env, name, None, content)
+        code = bucket.code
+        if code is None:
+            code = env.compile(content, name)
+            bucket.code = code
+            bytecode_cache.set_bucket(bucket)
+        return env.template_class.from_code(env, code, env.make_globals(None))
+
+    def invalidate(self, template_id: uuid.UUID | str) -> None:
+        """Drop every compiled version of a template."""
+        template_id = str(template_id)
+        self._compiled.discard_where(lambda key, _: key[0] == template_id)
+
+    def clear(self) -> None:
+        self._compiled.clear()
+
+    async def warm_up(self) -> int:
+        """Precompile every stored template; returns the number compiled."""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(TemplateModel.id, TemplateModel.content)
+            )
+            rows = result.all()
+
+        compiled = 0
+        for template_id, content in rows:
+            try:
+                self.get(template_id, content)
+                compiled += 1
+            except TemplateError as e:
+                logger.warning(f"Skipping template {template_id} during warm-up: {e}")
+        return compiled
+
+
+def create_bytecode_cache(directory: str | None) -> BytecodeCache | None:
+    """Build the on-disk bytecode cache shared between workers, if configured."""
+    if not directory:
+        return None
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(str(path), pattern="templr_%s.cache")
+
+
+template_cache = TemplateCache(
+    settings.template_cache_size,
+    create_bytecode_cache(settings.template_bytecode_cache_dir),
+)
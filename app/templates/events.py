@@ -0,0 +1,58 @@
+"""
+Cross-worker template change events.
+
+TemplateService publishes a notification whenever a template is created,
+updated or deleted; every worker listening on the channel drops its cached
+compiled template and rendered pages for that template, and forgets any
+failed lookups for the template's slug.
+"""
+
+import json
+import logging
+import uuid
+
+from app.notifications import NotificationListener, notify
+from app.public.cache import negative_cache, render_cache
+from app.templates.cache import template_cache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_CHANGED_CHANNEL = "templr_template_changed"
+
+
+def invalidate_template(
+    template_id: uuid.UUID | str, slug: str, version: int | None = None
+) -> None:
+    """Drop cached state for a template in this worker.
+
+    A version of None means the template was deleted.
+    """
+    template_cache.invalidate(template_id)
+    render_cache.invalidate_template(template_id, version)
+    negative_cache.forget_slug(slug)
+
+
+def clear_template_caches() -> None:
+    template_cache.clear()
+    render_cache.clear()
+    negative_cache.clear()
+
+
+async def publish_template_changed(
+    session: AsyncSession, template_id: uuid.UUID, slug: str, version: int | None
+) -> None:
+    """Announce a template change once the session's transaction commits."""
+    payload = json.dumps({"id": str(template_id), "slug": slug, "version": version})
+    await notify(session, TEMPLATE_CHANGED_CHANNEL, payload)
+
+
+def handle_template_changed(payload: str) -> None:
+    event = json.loads(payload)
+    logger.debug(f"Template {event['id']} changed (version {event['version']})")
+    invalidate_template(event["id"], event["slug"], event["version"])
+
+
+def register_template_events(listener: NotificationListener) -> None:
+    listener.subscribe(TEMPLATE_CHANGED_CHANNEL, handle_template_changed)
+    listener.on_reconnect(clear_template_caches)
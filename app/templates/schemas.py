@@ -59,6 +59,7 @@ class TemplateUpdate(BaseModel):
 class TemplateRead(TemplateBase):
     id: uuid.UUID
     owner_id: uuid.UUID
+    version: int
 
     class Config:
         from_attributes = True
@@ -1,5 +1,6 @@
 import uuid
 
+from app.templates.events import invalidate_template, publish_template_changed
 from app.templates.models import Template
 from app.templates.schemas import TemplateCreate, TemplateUpdate
 from app.users.models import User
@@ -7,6 +8,7 @@ from fastapi import HTTPException, status
 from sqlalchemy import and_, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
 
 class TemplateService:
@@ -28,8 +30,13 @@ class TemplateService:
 
         template = Template(**template_data.model_dump(), owner_id=owner.id)
         self.session.add(template)
+        await self.session.flush()
+        await publish_template_changed(
+            self.session, template.id, template.slug, template.version
+        )
         await self.session.commit()
         await self.session.refresh(template)
+        invalidate_template(template.id, template.slug, template.version)
         return template
 
     async def get_templates(
@@ -88,15 +95,34 @@ class TemplateService:
         update_data = template_data.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(template, field, value)
+        # Incremented in the UPDATE itself, so concurrent edits each get
+        # their own version instead of failing a version check
+        template.version = Template.version + 1
+        try:
+            await self.session.flush()
+        except StaleDataError:
+            await self.session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Template was deleted while it was being updated",
+            )
+        await self.session.refresh(template, ["version"])
 
+        await publish_template_changed(
+            self.session, template.id, template.slug, template.version
+        )
         await self.session.commit()
         await self.session.refresh(template)
+        invalidate_template(template.id, template.slug, template.version)
         return template
 
     async def delete_template(self, template_id: uuid.UUID, owner: User):
         template = await self.get_template_by_id(template_id, owner)
+        slug = template.slug
         await self.session.delete(template)
+        await publish_template_changed(self.session, template_id, slug, None)
         await self.session.commit()
+        invalidate_template(template_id, slug)
 
     async def count_user_templates(self, owner_id: uuid.UUID) -> int:
         """Count templates owned by a user"""
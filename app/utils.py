@@ -1,97 +1,36 @@
 from datetime import date, datetime, timedelta
-import hashlib
 import math
-import secrets
-import string
 from typing import Any
+import uuid
 
-from app.data_upload.models import UploadedData
+from app.config import settings
+from app.templates.cache import template_cache
 from jinja2 import Template, TemplateError
 import numpy as np
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-
-
-def generate_unique_identifier(data: dict[str, Any], min_length: int = 6) -> str:
-    """Generate a unique identifier based on data content."""
-    # Create a hash from the data
-    data_str = str(sorted(data.items()))
-    hash_obj = hashlib.sha256(data_str.encode())
-    hex_hash = hash_obj.hexdigest()
-
-    # Start with minimum length and increase if needed for collision detection
-    return hex_hash[:min_length]
-
-
-async def get_existing_identifiers(session: AsyncSession) -> set:
-    """Fetch all existing identifiers from the database for fast lookup."""
-    result = await session.execute(select(UploadedData.identifier))
-    identifiers = result.scalars().all()
-    return set(identifiers)
-
-
-def generate_unique_identifier_from_set(
-    data: dict[str, Any],
-    existing_identifiers: set,
-    min_length: int = 6,
-    max_length: int = 32,
-) -> str:
-    """Generate a unique identifier that doesn't exist in the provided set."""
-    for length in range(min_length, max_length + 1):
-        identifier = generate_unique_identifier(data, length)
-
-        if identifier not in existing_identifiers:
-            # Add to set to keep it up to date
-            existing_identifiers.add(identifier)
-            return identifier
-
-    # If we can't find a unique identifier, add random suffix
-    base_identifier = generate_unique_identifier(data, max_length - 4)
-
-    # Keep trying with random suffixes until we find a unique one
-    for _ in range(100):  # Limit attempts to avoid infinite loop
-        random_suffix = "".join(
-            secrets.choice(string.ascii_lowercase + string.digits) for _ in range(4)
-        )
-        identifier = f"{base_identifier}{random_suffix}"
-
-        if identifier not in existing_identifiers:
-            existing_identifiers.add(identifier)
-            return identifier
-
-    # If all else fails, use timestamp-based suffix
-    import time
-
-    timestamp_suffix = str(int(time.time() * 1000))[-4:]
-    identifier = f"{base_identifier}{timestamp_suffix}"
-    existing_identifiers.add(identifier)
-    return identifier
-
-
-async def ensure_unique_identifier(
-    session: AsyncSession,
-    data: dict[str, Any],
-    min_length: int = 6,
-    max_length: int = 32,
-) -> str:
-    """Ensure the identifier is unique in the database."""
-    existing_identifiers = await get_existing_identifiers(session)
-    return generate_unique_identifier_from_set(
-        data, existing_identifiers, min_length, max_length
-    )
 
 
 def calculate_expiry_date() -> datetime:
-    """Calculate expiry date (30 days from now)."""
+    """Calculate expiry date (data_retention_days from now)."""
     from datetime import timezone
 
-    return datetime.now(timezone.utc) + timedelta(days=30)
+    return datetime.now(timezone.utc) + timedelta(days=settings.data_retention_days)
 
 
-def render_template(template_content: str, variables: dict[str, Any]) -> str:
-    """Render a Jinja2 template with the provided variables."""
+def render_template(
+    template_content: str,
+    variables: dict[str, Any],
+    template_id: uuid.UUID | str | None = None,
+) -> str:
+    """Render a Jinja2 template with the provided variables.
+
+    When a template_id is given the compiled template is reused from the
+    shared template cache instead of being recompiled on every call.
+    """
     try:
-        template = Template(template_content)
+        if template_id is not None:
+            template = template_cache.get(template_id, template_content)
+        else:
+            template = Template(template_content)
         return template.render(**variables)
     except TemplateError as e:
         raise ValueError(f"Template rendering error: {str(e)}")
@@ -304,6 +243,20 @@ def make_template_ready(data: Any, var_type: str | None = None) -> Any:
         return data
 
 
+def parse_stored_value(value: Any, var_type: str | None) -> Any:
+    """Convert a stored JSON value back for rendering, given its variable type.
+
+    Dates are stored as ISO strings and parsed back to datetime objects;
+    values that don't parse are kept as they are.
+    """
+    if var_type == "date" and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    return value
+
+
 def _is_nan_value(data: Any) -> bool:
     """Check if a value is NaN in any form"""
     try:
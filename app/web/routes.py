@@ -1,6 +1,8 @@
 import uuid
 
 from app.auth.config import fastapi_users
+from app.config import settings
+from app.data_upload.readers import columnar_supported
 from app.data_upload.service import DataUploadService
 from app.database import get_async_session
 from app.templates.service import TemplateService
@@ -117,6 +119,8 @@ async def data_upload_page(
             "user": user,
             "templates": user_templates,
             "recent_jobs": recent_jobs,
+            "columnar_supported": columnar_supported(),
+            "default_result_format": settings.upload_result_format,
         },
     )
 
@@ -0,0 +1,57 @@
+"""
+Standalone upload ingestion worker.
+
+    python -m app.worker
+
+Claims and processes upload jobs from the queue until interrupted, so
+ingestion can run on separate nodes from the web processes. Set
+TEMPLR_UPLOAD_EMBEDDED_WORKER=false on the web processes when using it.
+It also runs the expired-data reaper unless TEMPLR_DATA_REAPER_INTERVAL=0.
+"""
+
+import asyncio
+import logging
+import signal
+
+from app.config import settings
+from app.data_upload.processing import shutdown_process_pool
+from app.data_upload.reaper import DataReaper
+from app.data_upload.service import UPLOAD_JOB_QUEUED_CHANNEL
+from app.data_upload.worker import UploadWorker
+from app.logging_config import setup_logging
+from app.notifications import notification_listener
+
+log = logging.getLogger(__name__)
+
+
+async def run_worker() -> None:
+    worker = UploadWorker()
+    notification_listener.subscribe(UPLOAD_JOB_QUEUED_CHANNEL, worker.wake)
+    await notification_listener.start()
+    await worker.start()
+    data_reaper = None
+    if settings.data_reaper_interval:
+        data_reaper = DataReaper()
+        await data_reaper.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    log.info("Shutting down upload worker...")
+    if data_reaper is not None:
+        await data_reaper.stop()
+    await worker.stop()
+    await notification_listener.stop()
+    shutdown_process_pool()
+
+
+def main():
+    setup_logging()
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script for deleting the files of old upload jobs
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pathlib import Path
+import tempfile
+from types import SimpleNamespace
+import uuid
+
+from app.data_upload.reaper import delete_job_files
+
+
+def test_delete_job_files():
+    """A job's recorded files and the leftovers of interrupted attempts go"""
+    job_id = uuid.uuid4()
+    other_id = uuid.uuid4()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        upload_dir = Path(tmp_dir)
+        result = upload_dir / f"result_{job_id}.csv"
+        failed = upload_dir / f"failed_{job_id}.csv"
+        source = upload_dir / f"{uuid.uuid4()}_upload.csv"
+        for path in (result, failed, source):
+            path.write_text("name\nJohn\n")
+        # Left behind by attempts that wrote another format
+        leftover = upload_dir / f"result_{job_id}.parquet.partial"
+        leftover.write_bytes(b"PAR1")
+        parts = upload_dir / f"failed_{job_id}.arrow.parts"
+        parts.mkdir()
+        (parts / "000000.arrow").write_bytes(b"part")
+        (parts / "000001.arrow").write_bytes(b"part")
+        other = upload_dir / f"result_{other_id}.csv"
+        other.write_text("name\nJane\n")
+
+        job = SimpleNamespace(
+            id=job_id,
+            result_file_path=str(result),
+            failed_file_path=str(failed),
+            source_file_path=str(source),
+        )
+        deleted = delete_job_files(job, upload_dir)
+        print(f"Deleted {deleted}, left: {sorted(os.listdir(upload_dir))}")
+        assert deleted == 5
+        assert os.listdir(upload_dir) == [other.name]
+
+        # Files that are already gone aren't counted
+        assert delete_job_files(job, upload_dir) == 0
+
+        # Leftovers are found even when the job recorded no files
+        leftover.write_bytes(b"PAR1")
+        job = SimpleNamespace(
+            id=job_id,
+            result_file_path=None,
+            failed_file_path=None,
+            source_file_path=None,
+        )
+        assert delete_job_files(job, upload_dir) == 1
+        assert not leftover.exists() and other.exists()
+
+
+if __name__ == "__main__":
+    test_delete_job_files()
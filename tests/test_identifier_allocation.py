@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for database-arbitrated identifier allocation during uploads
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.data_upload.service import DataUploadService
+from app.identifiers import (
+    IdentifierStrategy,
+    get_identifier_strategy,
+    identifier_strategy,
+)
+from sqlalchemy.exc import DBAPIError
+
+
+class FakeSession:
+    """Mimics INSERT ... ON CONFLICT (identifier) DO NOTHING RETURNING identifier"""
+
+    def __init__(self, existing: set[str], rejected: set[str] = frozenset()):
+        self.identifiers = set(existing)
+        self.rejected = rejected
+        self.statements = 0
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        savepoint = set(self.identifiers)
+        try:
+            yield
+        except Exception:
+            self.identifiers = savepoint
+            raise
+
+    async def scalars(self, statement, params):
+        self.statements += 1
+        if any(record["payload"]["loan"]["name"] in self.rejected for record in params):
+            raise DBAPIError("INSERT", {}, Exception("value too long"))
+        inserted = []
+        for record in params:
+            if record["identifier"] not in self.identifiers:
+                self.identifiers.add(record["identifier"])
+                inserted.append(record["identifier"])
+        return inserted
+
+
+def candidates_for(payload):
+    return identifier_strategy.candidates(identifier_strategy.digests([payload])[0])
+
+
+def test_identifier_strategies():
+    """Each strategy yields distinct candidates that grow after conflicts"""
+    payloads = [{"loan": {"name": "John"}}, {"loan": {"name": "Jane"}}]
+    for name in ["sha256", "blake2", "random"]:
+        strategy = get_identifier_strategy(name)
+        digests = strategy.digests(payloads)
+        candidates = list(strategy.candidates(digests[0]))
+        print(f"{name}: {candidates[:3]}")
+        assert len(candidates[0]) == 6
+        assert len(candidates) == len(set(candidates))
+        assert all(len(candidate) <= 32 for candidate in candidates)
+
+    # Content-derived schemes give equal payloads equal identifiers
+    blake2 = get_identifier_strategy("blake2")
+    same = [{"b": 1, "a": "x"}, {"a": "x", "b": 1}]
+    first, second = blake2.digests(same)
+    assert first == second and first.isalnum()
+    assert next(blake2.candidates(first)) == first[:6]
+
+    # The legacy scheme keeps the identifiers generated before
+    sha256 = get_identifier_strategy("sha256")
+    assert next(sha256.candidates(sha256.digests(same[:1])[0])) == "d45559"
+
+    try:
+        get_identifier_strategy("hashids")
+    except ValueError as e:
+        print(f"Rejected: {e}")
+    else:
+        raise AssertionError("Expected an unknown strategy to be rejected")
+
+    # A strategy that doesn't implement digests() can't be created
+    class Incomplete(IdentifierStrategy):
+        name = "incomplete"
+
+    try:
+        Incomplete()
+    except TypeError as e:
+        print(f"Rejected: {e}")
+    else:
+        raise AssertionError("Expected an incomplete strategy to be rejected")
+
+
+def test_conflicts_retry_with_next_candidate():
+    """Rows that conflict with stored or same-batch rows get longer identifiers"""
+    john = {"loan": {"name": "John"}}
+    jane = {"loan": {"name": "Jane"}}
+    taken = next(candidates_for(john))
+    session = FakeSession(existing={taken})
+
+    payloads = [john, jane, jane]
+    records = [{"payload": payload} for payload in payloads]
+    candidates = [candidates_for(payload) for payload in payloads]
+    asyncio.run(DataUploadService._insert_batch(session, records, candidates))
+
+    identifiers = [record["identifier"] for record in records]
+    print(f"Allocated: {identifiers} in {session.statements} statements")
+    assert len(set(identifiers)) == 3
+    assert taken not in identifiers
+    assert len(identifiers[0]) == 7 and len(identifiers[2]) == 7
+    assert session.statements == 2
+
+
+def test_failed_row_does_not_abort_batch():
+    """A row the database rejects is reported; the rest of the batch is stored"""
+    session = FakeSession(existing=set(), rejected={"Bad"})
+    records = [
+        {"payload": {"loan": {"name": name}}} for name in ["John", "Bad", "Jane"]
+    ]
+    service = DataUploadService.__new__(DataUploadService)
+    digests = identifier_strategy.digests([record["payload"] for record in records])
+    errors = asyncio.run(service._store_batch(session, records, digests))
+
+    print(f"Storage errors: {errors}")
+    assert list(errors) == [1]
+    assert "value too long" in errors[1]
+    assert session.identifiers == {records[0]["identifier"], records[2]["identifier"]}
+    print("=== Identifier Allocation Test PASSED ===")
+
+
+if __name__ == "__main__":
+    test_identifier_strategies()
+    test_conflicts_retry_with_next_candidate()
+    test_failed_row_does_not_abort_batch()
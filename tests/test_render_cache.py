@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the rendered-page cache, negative cache, ETags and Cache-Control headers
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta, timezone
+import uuid
+
+from app.public.cache import (
+    NegativeCache,
+    RenderedPageCache,
+    cache_control,
+    etag_matches,
+    make_etag,
+)
+
+
+def test_rendered_page_cache():
+    """Pages are cached per slug and identifier and dropped with their template"""
+    cache = RenderedPageCache(max_entries=10, max_bytes=1024, ttl=60)
+    template_id = uuid.uuid4()
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+
+    page = cache.store("invoice", "abc123", template_id, 1, "<p>Hi</p>", expires_at)
+    print(f"Stored page with ETag {page.etag}")
+    assert cache.get("invoice", "abc123") is page
+    assert cache.get("invoice", "other") is None
+
+    # Notifications about the version already cached keep the page
+    cache.invalidate_template(template_id, version=1)
+    assert cache.get("invoice", "abc123") is page
+
+    cache.invalidate_template(template_id, version=2)
+    assert cache.get("invoice", "abc123") is None
+
+    # A page rendered from the old version after the notification isn't kept
+    page = cache.store("invoice", "late", template_id, 1, "<p>Hi</p>", expires_at)
+    assert page.template_version == 1
+    assert cache.get("invoice", "late") is None
+    cache.store("invoice", "late", template_id, 2, "<p>Hello</p>", expires_at)
+    assert cache.get("invoice", "late") is not None
+
+    # Nor is one rendered from a template that has since been deleted
+    deleted_id = uuid.uuid4()
+    cache.invalidate_template(deleted_id)
+    cache.store("invoice", "gone", deleted_id, 5, "<p>Bye</p>", expires_at)
+    assert cache.get("invoice", "gone") is None
+
+    # Expired data is never served from the cache
+    cache.store(
+        "invoice", "old", template_id, 2, "<p>Old</p>", datetime.now(timezone.utc)
+    )
+    assert cache.get("invoice", "old") is None
+
+    # Pages larger than the byte budget are not cached
+    cache.store("invoice", "big", template_id, 2, "x" * 2048, expires_at)
+    assert cache.get("invoice", "big") is None
+
+    # The byte budget evicts least recently used pages
+    for i in range(5):
+        cache.store("invoice", f"row{i}", template_id, 2, "y" * 300, expires_at)
+    assert cache.get("invoice", "row0") is None
+    assert cache.get("invoice", "row4") is not None
+
+    print("=== Rendered Page Cache Test PASSED ===")
+
+
+def test_conditional_get_helpers():
+    """ETag matching and Cache-Control follow the data expiry"""
+    etag = make_etag(b"<p>Hi</p>")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+    soon = datetime.now(timezone.utc) + timedelta(seconds=30)
+    later = datetime.now(timezone.utc) + timedelta(days=30)
+    print(f"Cache-Control for soon-expiring data: {cache_control(soon)}")
+    assert cache_control(soon) in ("private, max-age=29", "private, max-age=30")
+    assert cache_control(later) == "private, max-age=300"
+    assert cache_control(datetime.now(timezone.utc)) == "private, max-age=0"
+
+
+def test_negative_cache():
+    """Failed lookups are answered per slug, identifier or page until forgotten"""
+    cache = NegativeCache(max_entries=10, ttl=60)
+
+    cache.remember_slug("wp-admin", 404, "Template not found")
+    assert cache.get("wp-admin", "setup.php").detail == "Template not found"
+
+    cache.remember_identifier("expired1", 410, "Data has expired")
+    assert cache.get("invoice", "expired1").status_code == 410
+    assert cache.get("receipt", "expired1").status_code == 410
+
+    cache.remember_page("receipt", "abc123", 404, "Template payload not found")
+    assert cache.get("receipt", "abc123") is not None
+    assert cache.get("invoice", "abc123") is None
+
+    # Creating a template with the slug forgets its misses
+    cache.forget_slug("wp-admin")
+    cache.forget_slug("receipt")
+    assert cache.get("wp-admin", "setup.php") is None
+    assert cache.get("receipt", "abc123") is None
+
+    # Entries expire after the TTL
+    short_lived = NegativeCache(max_entries=10, ttl=0)
+    short_lived.remember_slug("typo", 404, "Template not found")
+    assert short_lived.get("typo", "abc123") is None
+
+    print("=== Negative Cache Test PASSED ===")
+
+
+def test_negative_cache_reserved_slugs():
+    """Slugs named like the key tags don't collide with other misses"""
+    cache = NegativeCache(max_entries=10, ttl=60)
+
+    cache.remember_page("identifier", "abc123", 404, "Template payload not found")
+    assert cache.get("invoice", "abc123") is None
+
+    cache.remember_page("slug", "foo", 404, "Template payload not found")
+    assert cache.get("foo", "other") is None
+
+    # Only the forgotten slug's misses go
+    cache.remember_identifier("slug", 410, "Data has expired")
+    cache.forget_slug("slug")
+    assert cache.get("slug", "foo") is None
+    assert cache.get("invoice", "slug").status_code == 410
+    assert cache.get("identifier", "abc123") is not None
+
+    print("=== Negative Cache Reserved Slugs Test PASSED ===")
+
+
+if __name__ == "__main__":
+    test_rendered_page_cache()
+    test_conditional_get_helpers()
+    test_negative_cache()
+    test_negative_cache_reserved_slugs()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled template cache used by the public render path
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import uuid
+
+from app.templates.cache import TemplateCache, create_bytecode_cache
+from app.utils import render_template
+
+
+def test_template_cache():
+    """Compiled templates are reused until the content or template changes"""
+    cache = TemplateCache(max_entries=2)
+    template_id = uuid.uuid4()
+
+    first = cache.get(template_id, "Hello {{ name }}")
+    second = cache.get(template_id, "Hello {{ name }}")
+    print(f"Same compiled template reused: {first is second}")
+    assert first is second
+    assert first.render(name="John") == "Hello John"
+
+    # Changing the content compiles a new template
+    edited = cache.get(template_id, "Hi {{ name }}")
+    assert edited is not first
+    assert edited.render(name="John") == "Hi John"
+
+    # Invalidation drops every version of the template
+    cache.invalidate(template_id)
+    assert cache.get(template_id, "Hi {{ name }}") is not edited
+
+    # LRU eviction keeps the cache bounded
+    for _ in range(3):
+        cache.get(uuid.uuid4(), "{{ value }}")
+    assert len(cache._compiled) == 2
+
+    print("=== Template Cache Test PASSED ===")
+
+
+def test_bytecode_cache_shared_between_caches():
+    """A second cache (another worker) loads compiled code from disk"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        template_id = uuid.uuid4()
+        content = "Hello {{ name }}"
+
+        first_worker = TemplateCache(4, create_bytecode_cache(cache_dir))
+        first_worker.get(template_id, content)
+        cache_files = os.listdir(cache_dir)
+        print(f"Bytecode cache files: {cache_files}")
+        assert len(cache_files) == 1
+
+        second_worker = TemplateCache(4, create_bytecode_cache(cache_dir))
+        second_worker.environment.compile = None  # Must not recompile
+        template = second_worker.get(template_id, content)
+        assert template.render(name="Jane") == "Hello Jane"
+
+
+def test_render_template_with_id():
+    """render_template renders identically with and without the cache"""
+    content = "Due on {{ due_date.strftime('%d %b %Y') }}: {{ amount }}"
+    from datetime import datetime
+
+    variables = {"due_date": datetime(2025, 7, 1), "amount": 1500.5}
+    cached = render_template(content, variables, template_id=uuid.uuid4())
+    uncached = render_template(content, variables)
+    print(f"Rendered: {cached}")
+    assert cached == uncached == "Due on 01 Jul 2025: 1500.5"
+
+
+if __name__ == "__main__":
+    test_template_cache()
+    test_bytecode_cache_shared_between_caches()
+    test_render_template_with_id()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for listing the uploaded rows of a template
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import uuid
+
+from app.data_upload.models import UploadedData
+from app.data_upload.payloads import encode_values
+from app.data_upload.routes import router
+from app.data_upload.service import DataUploadService
+from sqlalchemy.dialects import postgresql
+from starlette.routing import Match
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Records the statement and returns canned (UploadedData, schema) rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statement = None
+        self.expunged = []
+
+    async def execute(self, statement):
+        self.statement = statement
+        return FakeResult(self.rows)
+
+    def expunge(self, instance):
+        self.expunged.append(instance)
+
+
+def uploaded_row(**columns):
+    return UploadedData(
+        identifier=uuid.uuid4().hex[:6],
+        template_slugs=["offers/2025"],
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        **columns,
+    )
+
+
+def test_template_data_query():
+    """Rows are filtered by template, owner and expiry"""
+    owner = SimpleNamespace(id=uuid.uuid4())
+    session = FakeSession([])
+    service = DataUploadService(session)
+    asyncio.run(service.get_uploaded_data_for_template("offers/2025", owner, 10, 5))
+
+    compiled = session.statement.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    where = sql[sql.index("WHERE") :]
+    print(where)
+    assert "uploaded_data.template_slugs @> " in where
+    assert "uploaded_data.owner_id = " in where
+    assert "uploaded_data.expires_at >= now()" in where
+    params = set(map(str, compiled.params.values()))
+    assert str(["offers/2025"]) in params
+    assert str(owner.id) in params
+    assert "ORDER BY uploaded_data.created_at DESC" in sql
+    assert compiled.params["param_1"] == 5 and compiled.params["param_2"] == 10
+
+
+def test_template_data_payloads():
+    """Packed rows are returned with decoded payloads, others untouched"""
+    schema = {
+        "columns": [{"name": "name", "type": "string"}],
+        "templates": {"offers/2025": {"name": 0}},
+    }
+    stored = uploaded_row(payload={"offers/2025": {"name": "John"}})
+    packed = uploaded_row(payload=None, payload_blob=encode_values(["Jane"]))
+    session = FakeSession([(stored, None), (packed, schema)])
+    owner = SimpleNamespace(id=uuid.uuid4())
+    rows = asyncio.run(
+        DataUploadService(session).get_uploaded_data_for_template("offers/2025", owner)
+    )
+    assert [row.payload for row in rows] == [
+        {"offers/2025": {"name": "John"}},
+        {"offers/2025": {"name": "Jane"}},
+    ]
+    # The decoded payload is never written back
+    assert session.expunged == [packed]
+
+
+def test_template_data_route():
+    """Slugs containing slashes reach the template data endpoint"""
+    route = next(
+        route
+        for route in router.routes
+        if route.path == "/data-upload/templates/{slug:path}/data"
+    )
+    scope = {
+        "type": "http",
+        "path": "/data-upload/templates/offers/2025/data",
+        "method": "GET",
+    }
+    match, child_scope = route.matches(scope)
+    assert match == Match.FULL
+    assert child_scope["path_params"] == {"slug": "offers/2025"}
+
+
+if __name__ == "__main__":
+    test_template_data_query()
+    test_template_data_payloads()
+    test_template_data_route()
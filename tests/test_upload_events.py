@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for upload job progress events and their server-sent event stream
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import uuid
+
+from app.data_upload.events import job_event_stream, job_progress_broker
+
+
+def progress(job_id: uuid.UUID, status: str, processed_rows: int) -> dict:
+    return {
+        "id": str(job_id),
+        "status": status,
+        "processed_rows": processed_rows,
+        "total_rows": 100,
+        "rows_per_second": 50.0,
+        "eta_seconds": (100 - processed_rows) / 50,
+        "error_message": None,
+    }
+
+
+def test_event_stream():
+    """Published events reach the job's stream, which ends once the job finishes"""
+
+    async def run():
+        job_id = uuid.uuid4()
+        other_job_id = uuid.uuid4()
+        stream = job_event_stream(job_id, progress(job_id, "processing", 0))
+        messages = [await anext(stream)]
+
+        job_progress_broker.handle_notification(
+            json.dumps(progress(other_job_id, "processing", 10))
+        )
+        job_progress_broker.handle_notification(
+            json.dumps(progress(job_id, "processing", 50))
+        )
+        job_progress_broker.publish(progress(job_id, "completed", 100))
+        messages += [message async for message in stream]
+        return job_id, messages
+
+    job_id, messages = asyncio.run(run())
+    for message in messages:
+        print(message.strip())
+    events = [json.loads(message.split("data: ")[1]) for message in messages]
+    assert all(message.startswith("event: progress\n") for message in messages)
+    assert [event["processed_rows"] for event in events] == [0, 50, 100]
+    assert events[-1]["status"] == "completed"
+    # The stream unsubscribed when it ended
+    assert str(job_id) not in job_progress_broker._queues
+
+
+def test_slow_client_gets_latest():
+    """A full queue drops the oldest event instead of blocking the listener"""
+    job_id = uuid.uuid4()
+    queue = job_progress_broker.subscribe(job_id)
+    for processed_rows in range(job_progress_broker.max_pending + 5):
+        job_progress_broker.publish(progress(job_id, "processing", processed_rows))
+    job_progress_broker.unsubscribe(job_id, queue)
+
+    received = [queue.get_nowait()["processed_rows"] for _ in range(queue.qsize())]
+    print(f"Received {received}")
+    assert len(received) == job_progress_broker.max_pending
+    assert received[-1] == job_progress_broker.max_pending + 4
+
+
+if __name__ == "__main__":
+    test_event_stream()
+    test_slow_client_gets_latest()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized mapping and validation of uploaded files
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from pathlib import Path
+import tempfile
+
+from app.data_upload import payloads, readers
+from app.data_upload.payloads import (
+    SHARED_KEY,
+    decode_values,
+    encode_values,
+    expand_payload,
+    load_payload,
+    template_ready_payload,
+)
+from app.data_upload.processing import (
+    FailureLimit,
+    TemplateSpec,
+    build_template_frame,
+    process_upload_chunk,
+    run_in_process_pool,
+    shutdown_process_pool,
+)
+from app.data_upload.readers import (
+    CalamineReader,
+    OpenpyxlReader,
+    columnar_supported,
+    open_upload_reader,
+)
+from app.data_upload.writers import CsvRowWriter, open_row_writer
+from app.identifiers import identifier_strategy
+import pandas as pd
+
+TEMPLATE = TemplateSpec(
+    slug="loan",
+    name="Loan",
+    variables=[
+        {"name": "name", "type": "string", "aliases": ["Customer Name"]},
+        {"name": "amount", "type": "number", "aliases": []},
+        {"name": "due_date", "type": "date", "aliases": []},
+    ],
+)
+
+
+def test_build_template_frame():
+    """Columns are mapped once and coerced to the variable types"""
+    df = pd.DataFrame(
+        {
+            "Customer Name": ["John", "Jane", None, "Bob"],
+            "Amount": ["1500", "99.5", None, "abc"],
+            "due_date": ["2025-07-01", None, "2025-07-03", "2025-07-04"],
+        }
+    )
+    frame, errors = build_template_frame(df, TEMPLATE)
+    records = frame.to_dict("records")
+    print(f"Records: {records}")
+
+    assert records[0] == {
+        "name": "John",
+        "amount": 1500,
+        "due_date": "2025-07-01T00:00:00",
+    }
+    assert records[1]["amount"] == 99.5
+    # Missing values are imputed per type
+    assert records[1]["due_date"] == "1970-01-01T00:00:00"
+    assert records[2]["name"] == "" and records[2]["amount"] == -1
+
+    assert errors.iloc[:3].isna().all()
+    assert errors.iloc[3] == (
+        "Template 'loan': Variable 'amount' should be number, got invalid value: abc"
+    )
+    print("=== Build Template Frame Test PASSED ===")
+
+
+def test_chunked_processing():
+    """Chunks keep file row numbers; invalid rows keep their original data"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.csv"
+        pd.DataFrame(
+            {
+                "name": ["John", "Jane", "Bob"],
+                "amount": [1500, 2000, 3000],
+                "due_date": ["2025-07-01", "not a date", "2025-07-03"],
+            }
+        ).to_csv(file_path, index=False)
+
+        reader = open_upload_reader(file_path, chunk_rows=2)
+        assert reader.count_rows() == 3
+        chunks = []
+        first_row_number = 1
+        for chunk in reader.chunks():
+            chunks.append(
+                process_upload_chunk(
+                    chunk, [TEMPLATE], identifier_strategy, first_row_number
+                )
+            )
+            first_row_number += len(chunk)
+
+    rows = [row for processed in chunks for row in processed.rows]
+    print(f"Valid rows: {[row.row_number for row in rows]}")
+    assert [processed.total_rows for processed in chunks] == [2, 1]
+    assert [row.row_number for row in rows] == [1, 3]
+    assert rows[1].payloads["loan"]["amount"] == 3000
+    assert rows[0].identifier_digest != rows[1].identifier_digest
+
+    failed = chunks[0].failed_rows[0]
+    print(f"Failed row: {failed}")
+    assert failed["name"] == "Jane"
+    assert failed["_row_number"] == 2
+    assert "invalid format: not a date" in failed["_error_reason"]
+
+
+def test_csv_chunk_types():
+    """CSV values are typed the same whichever chunk they are read in"""
+    account = TemplateSpec(
+        slug="account",
+        name="Account",
+        variables=[
+            {"name": "acct", "type": "string", "aliases": []},
+            {"name": "amount", "type": "number", "aliases": []},
+        ],
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.csv"
+        # A blank cell would make pandas infer floats for the first chunk only
+        file_path.write_text("acct,amount\n12345,10\n,\n34567,40\n")
+        reader = open_upload_reader(file_path, chunk_rows=2)
+        rows = [
+            row
+            for chunk in reader.chunks()
+            for row in process_upload_chunk(chunk, [account], identifier_strategy).rows
+        ]
+
+    payloads = [row.payloads["account"] for row in rows]
+    print(f"Payloads: {payloads}")
+    assert payloads == [
+        {"acct": "12345", "amount": 10},
+        {"acct": "", "amount": -1},
+        {"acct": "34567", "amount": 40},
+    ]
+    assert all(type(payload["amount"]) is int for payload in payloads)
+
+
+def test_shared_payload_storage():
+    """Variables templates have in common are stored once and expand back"""
+    offer = TemplateSpec(
+        slug="offer",
+        name="Offer",
+        variables=[
+            {"name": "name", "type": "string", "aliases": ["Customer Name"]},
+            # Same column as the loan's amount, but a different type
+            {"name": "amount", "type": "string", "aliases": []},
+            {"name": "code", "type": "string", "aliases": []},
+        ],
+    )
+    df = pd.DataFrame(
+        {
+            "Customer Name": ["John"],
+            "amount": [1500],
+            "due_date": ["2025-07-01"],
+            "code": ["A1"],
+        }
+    )
+    processed = process_upload_chunk(
+        df, [TEMPLATE, offer], identifier_strategy, payload_storage="shared"
+    )
+    row = processed.rows[0]
+    stored = row.storage["payload"]
+    print(f"Stored payload: {stored}")
+    assert stored[SHARED_KEY] == {"name": "John"}
+    assert stored["loan"] == {"amount": 1500, "due_date": "2025-07-01T00:00:00"}
+    assert stored["offer"] == {"amount": "1500", "code": "A1"}
+    assert expand_payload(stored) == row.payloads
+
+    # A single template has nothing to share
+    processed = process_upload_chunk(
+        df, [TEMPLATE], identifier_strategy, payload_storage="shared"
+    )
+    assert processed.rows[0].storage["payload"] == processed.rows[0].payloads
+
+
+def test_packed_payload_storage():
+    """Packed rows hold positional values that decode back to the payloads"""
+    offer = TemplateSpec(
+        slug="offer",
+        name="Offer",
+        variables=[
+            {"name": "name", "type": "string", "aliases": ["Customer Name"]},
+            {"name": "amount", "type": "string", "aliases": []},
+            {"name": "code", "type": "string", "aliases": []},
+        ],
+    )
+    df = pd.DataFrame(
+        {
+            "Customer Name": ["John", "Jane"],
+            "amount": [1500, 2000],
+            "due_date": ["2025-07-01", "2025-07-02"],
+            "code": ["A1", "B2"],
+        }
+    )
+    processed = process_upload_chunk(
+        df, [TEMPLATE, offer], identifier_strategy, payload_storage="packed"
+    )
+    schema = processed.payload_schema
+    print(f"Payload schema: {schema}")
+    # The name is shared; the amounts differ in type, so they are not
+    assert [column["name"] for column in schema["columns"]] == [
+        "name",
+        "amount",
+        "due_date",
+        "amount",
+        "code",
+    ]
+    assert schema["templates"]["offer"] == {"name": 0, "amount": 3, "code": 4}
+    for row in processed.rows:
+        assert row.storage["payload"] is None
+        assert isinstance(row.storage["payload_blob"], bytes)
+        assert load_payload(None, row.storage["payload_blob"], schema) == row.payloads
+
+    # Without its job's schema a packed row can't be decoded
+    try:
+        load_payload(None, processed.rows[0].storage["payload_blob"], None)
+    except ValueError as e:
+        print(f"Refused: {e}")
+    else:
+        raise AssertionError("Expected a packed row without a schema to fail")
+
+    # Rendering types the values from the schema instead of the template
+    values = decode_values(processed.rows[0].storage["payload_blob"])
+    ready = template_ready_payload(
+        values, schema["columns"], schema["templates"]["loan"]
+    )
+    assert ready == {"name": "John", "amount": 1500, "due_date": datetime(2025, 7, 1)}
+
+
+def test_compact_payload_codecs():
+    """Packed values round-trip through msgpack and zstd when installed"""
+    values = ["John", 1500, None, "2025-07-01T00:00:00", "x" * 200]
+    if payloads.msgpack is None or payloads.zstandard is None:
+        print("msgpack/zstandard not installed, checking their blobs are refused")
+        for blob in (b"mn\x95", b"jz(\xb5/\xfd"):
+            try:
+                decode_values(blob)
+            except ValueError as e:
+                print(f"Refused: {e}")
+            else:
+                raise AssertionError(f"Decoded {blob!r} without its codec")
+        return
+
+    blob = encode_values(values)
+    assert blob[:2] == b"mz"
+    assert decode_values(blob) == values
+
+
+def test_streaming_excel_reader():
+    """Streamed .xlsx chunks match what pd.read_excel returns"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.xlsx"
+        expected = pd.DataFrame(
+            {
+                "name": ["John", "Jane", None, "N/A", "Ann"],
+                "amount": [1500, 2000.5, 3000, None, 1],
+                "due_date": pd.to_datetime(
+                    ["2025-07-01", "2025-07-02", None, "2025-07-04", "2025-07-05"]
+                ),
+            }
+        )
+        expected.to_excel(file_path, index=False)
+
+        reader = OpenpyxlReader(file_path, chunk_rows=2)
+        chunks = list(reader.chunks())
+        streamed = pd.concat(chunks, ignore_index=True)
+        print(streamed)
+        assert reader.count_rows() == 5
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        pd.testing.assert_frame_equal(
+            streamed.fillna(pd.NA), pd.read_excel(file_path).fillna(pd.NA)
+        )
+
+
+def test_calamine_reader():
+    """Date cells read by calamine validate like pd.read_excel's Timestamps"""
+    # calamine hands out datetime.date for date-formatted cells
+    rows = iter([("name", "due_date"), ("John", date(2025, 7, 1))])
+    chunk = next(readers._frames_from_rows(rows, chunk_rows=10))
+    assert chunk["due_date"].iloc[0] == pd.Timestamp("2025-07-01")
+    processed = process_upload_chunk(
+        chunk.assign(amount=[1500]), [TEMPLATE], identifier_strategy
+    )
+    assert not processed.failed_rows, processed.failed_rows
+    assert processed.rows[0].payloads["loan"]["due_date"] == "2025-07-01T00:00:00"
+
+    if readers.CalamineWorkbook is None:
+        print("python-calamine not installed, skipping the workbook check")
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.xlsx"
+        expected = pd.DataFrame(
+            {
+                "name": ["John", "Jane"],
+                "amount": [1500, 2000.5],
+                "due_date": pd.to_datetime(["2025-07-01", "2025-07-02"]),
+            }
+        )
+        expected.to_excel(file_path, index=False)
+        reader = CalamineReader(file_path, chunk_rows=10)
+        assert reader.count_rows() == 2
+        streamed = pd.concat(reader.chunks(), ignore_index=True)
+        print(streamed)
+        processed = process_upload_chunk(streamed, [TEMPLATE], identifier_strategy)
+        assert not processed.failed_rows, processed.failed_rows
+
+
+def test_too_many_failures():
+    """More than half of the rows failing aborts the upload"""
+    df = pd.DataFrame(
+        {"name": ["A", "B", "C"], "amount": ["x", "y", "1"], "due_date": [""] * 3}
+    )
+    failure_limit = FailureLimit(total_rows=len(df))
+    failure_limit.check(
+        process_upload_chunk(df[:1], [TEMPLATE], identifier_strategy).failed_rows
+    )
+    try:
+        failure_limit.check(
+            process_upload_chunk(df[1:], [TEMPLATE], identifier_strategy, 2).failed_rows
+        )
+    except ValueError as e:
+        print(f"Aborted: {e}")
+        assert str(e).startswith("Too many rows failed (2 out of 2)")
+    else:
+        raise AssertionError("Expected the upload to be aborted")
+
+
+def test_incremental_writer():
+    """Rows are appended chunk by chunk with a single header"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = CsvRowWriter(Path(tmp_dir) / "result.csv")
+        writer.write([])
+        assert writer.written_path is None
+
+        writer.write([{"name": "John", "url": "/a"}])
+        writer.write([{"name": "Jane", "url": "/b"}, {"name": "Bob", "url": "/c"}])
+        # Not under the result's name until it's complete
+        assert not writer.path.exists() and writer.partial_path.exists()
+        writer.close()
+        assert not writer.partial_path.exists()
+        result = pd.read_csv(writer.written_path)
+        print(result)
+        assert result["name"].tolist() == ["John", "Jane", "Bob"]
+        assert writer.rows_written == 3
+
+
+def test_resume_from_checkpoint():
+    """A resumed job drops output written after the checkpoint and skips rows"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "result.csv"
+        writer = CsvRowWriter(path)
+        writer.write([{"name": "John"}, {"name": "Jane"}])
+        state = writer.checkpoint()
+        # Written, but the job stopped before committing this chunk
+        writer.write([{"name": "Lost"}])
+        writer.suspend()
+
+        writer = CsvRowWriter(path)
+        writer.resume(state)
+        writer.write([{"name": "Bob"}])
+        writer.close()
+        result = pd.read_csv(path)
+        print(result)
+        assert result["name"].tolist() == ["John", "Jane", "Bob"]
+        assert writer.rows_written == 3
+
+        source = Path(tmp_dir) / "upload.csv"
+        pd.DataFrame({"n": range(25)}).to_csv(source, index=False)
+        reader = open_upload_reader(source, chunk_rows=10)
+        chunks = list(reader.chunks(start_row=12))
+        assert [len(chunk) for chunk in chunks] == [10, 3]
+        assert chunks[0]["n"].iloc[0] == "12"
+
+
+def test_process_pool_recovers_from_dead_child():
+    """A pool whose child died is replaced instead of failing every later job"""
+
+    async def run():
+        try:
+            # Stands in for a child killed by the OOM killer
+            await run_in_process_pool(os._exit, 1)
+        except BrokenProcessPool:
+            print("Child died, pool dropped")
+        else:
+            raise AssertionError("Expected the pool to break")
+        return await run_in_process_pool(abs, -3)
+
+    try:
+        assert asyncio.run(run()) == 3
+    finally:
+        shutdown_process_pool()
+
+
+def test_columnar_result_files():
+    """Parquet results unify column types across chunks and read back"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stem = Path(tmp_dir) / "result"
+        assert open_row_writer(stem, "csv").path == stem.with_suffix(".csv")
+        if not columnar_supported():
+            print("pyarrow not installed, checking the columnar formats are refused")
+            try:
+                open_row_writer(stem, "parquet")
+            except ValueError as e:
+                print(f"Refused: {e}")
+            else:
+                raise AssertionError("parquet writer created without pyarrow")
+            return
+
+        writer = open_row_writer(stem, "parquet")
+        # Nulls, ints then floats, and ints then strings in later chunks
+        writer.write([{"name": "John", "score": None, "code": 1}])
+        writer.write([{"name": "Jane", "score": 1, "code": 2}])
+        writer.write([{"name": "Bob", "score": 2.5, "code": "B3"}])
+        writer.close()
+        assert not writer.parts_dir.exists()
+
+        reader = open_upload_reader(writer.written_path, chunk_rows=2)
+        assert reader.count_rows() == 3
+        chunks = list(reader.chunks())
+        result = pd.concat(chunks, ignore_index=True)
+        print(result)
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert result["name"].tolist() == ["John", "Jane", "Bob"]
+        assert result["score"].tolist()[1:] == [1.0, 2.5]
+        assert result["code"].tolist() == ["1", "2", "B3"]
+
+
+if __name__ == "__main__":
+    test_build_template_frame()
+    test_chunked_processing()
+    test_csv_chunk_types()
+    test_shared_payload_storage()
+    test_packed_payload_storage()
+    test_compact_payload_codecs()
+    test_streaming_excel_reader()
+    test_calamine_reader()
+    test_too_many_failures()
+    test_incremental_writer()
+    test_resume_from_checkpoint()
+    test_process_pool_recovers_from_dead_child()
+    test_columnar_result_files()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming uploaded files to disk
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+from io import BytesIO
+from pathlib import Path
+import tempfile
+
+from app.config import settings
+from app.data_upload.service import DataUploadService
+from fastapi import HTTPException, UploadFile
+
+
+def save_upload(upload: UploadFile, file_path: Path, max_bytes: int, chunk_bytes: int):
+    """Save an upload with the given size limit and chunk size"""
+    limits = settings.upload_max_bytes, settings.upload_chunk_bytes
+    settings.upload_max_bytes, settings.upload_chunk_bytes = max_bytes, chunk_bytes
+    try:
+        service = DataUploadService(None)
+        return asyncio.run(service._save_upload(upload, file_path))
+    finally:
+        settings.upload_max_bytes, settings.upload_chunk_bytes = limits
+
+
+def test_save_upload():
+    """Uploads are written in chunks and their SHA-256 is returned"""
+    data = b"name,amount\n" + b"John,1500\n" * 1000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.csv"
+        upload = UploadFile(BytesIO(data), filename="upload.csv")
+        checksum = save_upload(upload, file_path, len(data), chunk_bytes=64)
+        print(f"Checksum: {checksum}")
+        assert checksum == hashlib.sha256(data).hexdigest()
+        assert file_path.read_bytes() == data
+
+
+def test_oversized_upload():
+    """An upload over the limit is rejected mid-stream and its file removed"""
+    upload = UploadFile(BytesIO(b"x" * 1000), filename="upload.csv")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "upload.csv"
+        try:
+            save_upload(upload, file_path, max_bytes=350, chunk_bytes=100)
+        except HTTPException as e:
+            print(f"Rejected: {e.status_code} {e.detail}")
+            assert e.status_code == 413
+            assert "350 byte limit" in e.detail
+        else:
+            raise AssertionError("Expected the oversized upload to be rejected")
+        assert os.listdir(tmp_dir) == []
+    # Reading stopped at the chunk that crossed the limit
+    assert upload.file.tell() == 400
+
+
+if __name__ == "__main__":
+    test_save_upload()
+    test_oversized_upload()
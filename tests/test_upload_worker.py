@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test script for the upload job queue: claiming, heartbeats, requeueing and releasing jobs
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from pathlib import Path
+import tempfile
+from types import SimpleNamespace
+import uuid
+
+from app.data_upload import worker as worker_module
+from app.data_upload.worker import UploadWorker
+from sqlalchemy.dialects import postgresql
+
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=1):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def scalar_one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Records the compiled statements and returns canned results in order"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        compiled = statement.compile(dialect=postgresql.dialect())
+        self.statements.append((str(compiled), compiled.params))
+        return self.results.pop(0) if self.results else FakeResult()
+
+    async def commit(self):
+        self.commits += 1
+
+
+@contextmanager
+def use_session(session):
+    """Make the worker module open `session` instead of a database session"""
+
+    @asynccontextmanager
+    async def session_maker():
+        yield session
+
+    original = worker_module.async_session_maker
+    worker_module.async_session_maker = session_maker
+    try:
+        yield
+    finally:
+        worker_module.async_session_maker = original
+
+
+def test_claim_job():
+    """The oldest pending job is claimed atomically, skipping locked rows"""
+    job_id = uuid.uuid4()
+    session = FakeSession(FakeResult([job_id]), FakeResult([]))
+    worker = UploadWorker(worker_id="node-1")
+    with use_session(session):
+        assert asyncio.run(worker.claim_job()) == job_id
+        # An empty queue claims nothing
+        assert asyncio.run(worker.claim_job()) is None
+    sql, params = session.statements[0]
+    print(sql)
+    assert sql.startswith("UPDATE upload_jobs SET status=")
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY upload_jobs.created_at" in sql
+    assert "attempts=(upload_jobs.attempts + " in sql
+    assert "heartbeat_at=now()" in sql
+    assert "processing" in params.values() and "pending" in params.values()
+    assert "node-1" in params.values()
+    assert session.commits == 2
+
+
+def test_requeue_orphaned_jobs():
+    """Orphaned jobs are requeued, or failed and cleaned up after max attempts"""
+    failed_id = uuid.uuid4()
+    requeued_id = uuid.uuid4()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            uploads = Path("uploads")
+            parts = uploads / f"failed_{failed_id}.parquet.parts"
+            parts.mkdir(parents=True)
+            (parts / "000000.arrow").write_bytes(b"part")
+            partial = uploads / f"result_{failed_id}.csv.partial"
+            partial.write_text("name\nJohn\n")
+            source = uploads / f"{uuid.uuid4()}_upload.csv"
+            source.write_text("name\nJohn\n")
+            kept = uploads / f"result_{requeued_id}.csv.partial"
+            kept.write_text("name\nJane\n")
+
+            failed_job = SimpleNamespace(
+                id=failed_id,
+                result_file_path=None,
+                failed_file_path=None,
+                source_file_path=str(source),
+            )
+            session = FakeSession(
+                FakeResult([failed_job]), FakeResult(), FakeResult([requeued_id])
+            )
+            with use_session(session):
+                asyncio.run(UploadWorker().requeue_orphaned_jobs())
+
+            print(f"Left in uploads: {sorted(os.listdir(uploads))}")
+            assert not parts.exists() and not partial.exists()
+            assert not source.exists()
+            # The requeued job resumes from its partial files
+            assert kept.exists()
+        finally:
+            os.chdir(cwd)
+
+    failed, deleted, requeued = session.statements
+    failed_sql, failed_params = failed
+    delete_sql, delete_params = deleted
+    requeue_sql, requeue_params = requeued
+    assert "upload_jobs.attempts >= " in failed_sql
+    assert "checkpoint=" in failed_sql and failed_params["checkpoint"] is None
+    assert "failed" in failed_params.values()
+    assert "upload_jobs.heartbeat_at IS NULL" in failed_sql
+    assert delete_sql.startswith("DELETE FROM uploaded_data")
+    assert "uploaded_data.job_id IN " in delete_sql
+    assert [failed_id] in delete_params.values()
+    assert "upload_jobs.attempts < " in requeue_sql
+    assert "pending" in requeue_params.values()
+    assert session.commits == 1
+
+    # Nothing to give up on: no rows are deleted
+    session = FakeSession(FakeResult([]), FakeResult([]))
+    with use_session(session):
+        asyncio.run(UploadWorker().requeue_orphaned_jobs())
+    assert len(session.statements) == 2
+    assert not any(sql.startswith("DELETE") for sql, _ in session.statements)
+
+
+def test_heartbeat_lease_loss():
+    """A worker whose heartbeat no longer matches the job stops working on it"""
+    job_id = uuid.uuid4()
+    session = FakeSession(FakeResult(rowcount=1), FakeResult(rowcount=0))
+    worker = UploadWorker(worker_id="node-1")
+    worker.lease = timedelta(seconds=0.03)
+
+    async def run():
+        job_task = asyncio.create_task(asyncio.sleep(10))
+        await worker._send_heartbeats(job_id, job_task)
+        try:
+            await job_task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    with use_session(session):
+        assert asyncio.run(run())
+    assert job_id in worker._lost_jobs
+    # One heartbeat was accepted, the next matched no row
+    assert len(session.statements) == 2
+    sql, params = session.statements[0]
+    assert "SET heartbeat_at=now()" in sql
+    assert "upload_jobs.worker_id = " in sql
+    assert "node-1" in params.values()
+
+
+def test_release_job():
+    """Jobs stopped by a shutdown go back to the queue without using an attempt"""
+
+    class BlockingService:
+        def __init__(self, session):
+            pass
+
+        async def process_upload_job(self, job_id):
+            await asyncio.sleep(10)
+
+    service = worker_module.DataUploadService
+    worker_module.DataUploadService = BlockingService
+    try:
+        for lost in (False, True):
+            job_id = uuid.uuid4()
+            session = FakeSession()
+            worker = UploadWorker(worker_id="node-1")
+
+            async def run():
+                task = asyncio.create_task(worker._run_job(job_id))
+                worker._jobs[job_id] = task
+                await asyncio.sleep(0)
+                if lost:
+                    worker._lost_jobs.add(job_id)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+            with use_session(session):
+                asyncio.run(run())
+            assert job_id not in worker._jobs
+            if lost:
+                # The job now belongs to another worker
+                assert session.statements == []
+                continue
+
+            sql, params = session.statements[0]
+            print(sql)
+            assert "attempts=(upload_jobs.attempts - " in sql
+            assert "upload_jobs.worker_id = " in sql
+            assert "upload_jobs.status = " in sql
+            assert "pending" in params.values() and "node-1" in params.values()
+            assert session.commits == 1
+    finally:
+        worker_module.DataUploadService = service
+
+
+if __name__ == "__main__":
+    test_claim_job()
+    test_requeue_orphaned_jobs()
+    test_heartbeat_lease_loss()
+    test_release_job()